@@ -343,7 +343,7 @@ def plot_2d_field(is_ave_time, q, plane, plotvar, ystr,
         myvmax = -1e8
         for i in range(0, ntimes):
             if plane:
-                currval = plotvar[i][::1, ::1, plane - 1]
+                currval = plotvar[i, :, :, plane - 1]
             else:
                 currval = plotvar[i]
 
@@ -372,12 +372,12 @@ def plot_2d_field(is_ave_time, q, plane, plotvar, ystr,
                 if plane== ui.ms_bottom:
                     pmax = ui.ms_top
                 else:
-                    pmax = plotvar[0].shape[-1]
-                refval = np.sum( plotvar[0][::1, ::1, abs(plane) - 1:pmax:1], axis=2 ) +1.e-6
-                currval = (np.sum( plotvar[i][::1, ::1, abs(plane) - 1:pmax:1], axis=2 ))/refval
+                    pmax = plotvar.shape[-1]
+                refval = np.sum( plotvar[0, :, :, abs(plane) - 1:pmax:1], axis=2 ) +1.e-6
+                currval = (np.sum( plotvar[i, :, :, abs(plane) - 1:pmax:1], axis=2 ))/refval
                 currval = np.where(refval>1.e-6, currval, -1.)
             else:
-                currval = plotvar[i][::1, ::1, plane - 1]
+                currval = plotvar[i, :, :, plane - 1]
             plane_str = '_Plane_%d' % abs(plane)
         else:
             currval = plotvar[i]
@@ -439,10 +439,10 @@ def plot_2d_field(is_ave_time, q, plane, plotvar, ystr,
                         head_length=width*3, length_includes_head=True)
         if color_burn:
             ##Color burned and burning cells
-            fire_locations = np.where(plotvar[0][:,:,0]!=plotvar[i][:,:,0])
+            fire_locations = np.where(plotvar.surface(0)!=plotvar.surface(i))
             plot_color(fire_locations, currval, 'red', myextent=q.horizontal_extent)
             
-            burned_locations = np.where((plotvar[0][:,:,0]!=plotvar[i][:,:,0]) & (plotvar[i][:,:,0]< 0.01))
+            burned_locations = np.where((plotvar.surface(0)!=plotvar.surface(i)) & (plotvar.surface(i)< 0.01))
             plot_color(burned_locations, currval, 'black', myextent=q.horizontal_extent)
             
         pylab.savefig(save_dir + os.sep + savestr + time_str + plane_str + '.png')
@@ -632,7 +632,7 @@ def plot_outputs(qu, qf, ignitions, ignite, flags, fb, ui):
         if ui.gen_suface_fuel_gif:
             #ZC make gif with arrow
             plot_2d_field(False, qf, plane, fuel_dens, "Fuel density [kg/m^3]", "fuels-dens-",
-                          [0., np.amax(fuel_dens[0][::1, ::1, plane-1], axis=None)], save_dir, img_specs,
+                          [0., np.amax(fuel_dens[0, :, :, plane-1], axis=None)], save_dir, img_specs,
                           draw_arrow=True, fuel_green = True, color_burn = True)
             make_gif("fuels-dens-",'GIF_fuel_dens.gif')
             
@@ -650,16 +650,8 @@ def plot_outputs(qu, qf, ignitions, ignite, flags, fb, ui):
     if flags.emissions == 1:
         print("  - pm emissions")
         emiss = read_fireca_field("pm_emissions-", qf.ntimes_ave, qf.time_ave, qf, 0)
-        minval = +1e8
-        maxval = -1.
-        for it in range(0, qf.ntimes_ave):
-            for k in range(0, qf. nz):
-                for i in range(0, qf.nx):
-                    for j in range(0, qf.ny):
-                        if emiss[it][i, j, k] > 0:
-                            emiss[it][i, j, k] = math.log10(emiss[it][i, j, k])
-                            minval = min(minval, emiss[it][i, j, k])
-                            maxval = max(maxval, emiss[it][i, j, k])
+        minval, maxval = log10_range(emiss)
+        emiss.set_transform(positive_log10)
         minval = math.floor(minval)
         maxval = math.ceil(maxval)
         plot_2d_field(True, qf, plane, emiss, "Soot (log10) [g]", "pm_emissions_",
@@ -668,16 +660,8 @@ def plot_outputs(qu, qf, ignitions, ignite, flags, fb, ui):
 
         print("  - co emissions")
         emiss = read_fireca_field("co_emissions-", qf.ntimes_ave, qf.time_ave, qf, 0)
-        minval = +1e8
-        maxval = -1.
-        for it in range(0, qf.ntimes_ave):
-            for k in range(0, qf. nz):
-                for i in range(0, qf.nx):
-                    for j in range(0, qf.ny):
-                        if emiss[it][i, j, k] > 0:
-                            emiss[it][i, j, k] = math.log10(emiss[it][i, j, k])
-                            minval = min(minval, emiss[it][i, j, k])
-                            maxval = max(maxval, emiss[it][i, j, k])
+        minval, maxval = log10_range(emiss)
+        emiss.set_transform(positive_log10)
         minval = math.floor(minval)
         maxval = math.ceil(maxval)
         plot_2d_field(True, qf, plane, emiss, "CO (log10) [g]", "co_emissions_",
@@ -1205,10 +1189,10 @@ def plot_topo_gif(filestr, myextent, save_dir, img_specs, qf, fuel_dens):
         cbar.ax.tick_params(labelsize=img_specs.colorbar_font["size"])
         
         ##Color burned and burning cells
-        fire_locations = np.where(fuel_dens[0][:,:,0]!=fuel_dens[i][:,:,0])
+        fire_locations = np.where(fuel_dens.surface(0)!=fuel_dens.surface(i))
         plot_color(fire_locations, currval, 'red', myextent)
         
-        burned_locations = np.where((fuel_dens[0][:,:,0]!=fuel_dens[i][:,:,0]) & (fuel_dens[i][:,:,0]< 0.01))
+        burned_locations = np.where((fuel_dens.surface(0)!=fuel_dens.surface(i)) & (fuel_dens.surface(i)< 0.01))
         plot_color(burned_locations, currval, 'black', myextent)
                      
         pylab.xlabel('X [m]', **img_specs.axis_font)
@@ -1267,8 +1251,117 @@ def plot_color(locations, currval, color, myextent):
     pylab.imshow(plot_bool,cmap=cmap, interpolation='none', origin='lower',
                  extent=myextent, vmin=0, vmax=1)
 
+class FirecaField:
+    """
+    Lazy reader for the Output/<filestr>NNNNN.bin files of one field.
+    Each file is memory-mapped when it is sliced and only the cells that are
+    asked for are decompressed (with qf.indexing from fire_indexes.bin), so
+    the field never has to fit in memory. Values are float32.
+        field[t]              (ny,nx,nvert) array at time index t
+        field[t, :, :, k]     (ny,nx) layer k, only layer k is read
+        field.surface(t)      same as field[t, :, :, 0]
+    With surface_only every time is the (ny,nx) surface layer, field[t] and
+    field[t, j, i] index it like the old 2D arrays.
+    transform(array) is applied to everything that is read.
+    The last cache_size arrays read are kept, they are read-only.
+    """
+    def __init__(self, filestr, times, qf, is_3d, nvert, surface_only=False,
+                 transform=None, cache_size=4):
+        self.filestr = filestr
+        self.times = times
+        self.qf = qf
+        self.is_3d = is_3d
+        self.nvert = nvert
+        self.surface_only = surface_only
+        self.transform = transform
+        self.cache_size = cache_size
+        self.cache = {}
+        self.layer_cells = None
+        self.shape = (qf.ny, qf.nx) if surface_only else (qf.ny, qf.nx, nvert)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for t in range(len(self)):
+            yield self[t]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        t, rest = key[0], key[1:]
+        if isinstance(t, slice):
+            return [self[(i,) + rest] for i in range(len(self))[t]]
+        if t < 0:
+            t += len(self)
+        if self.surface_only:
+            return self.surface(t)[rest]
+        if not rest:
+            return self.read(t)
+        rest = rest + (slice(None),) * (3 - len(rest))
+        if isinstance(rest[2], (int, np.integer)):
+            return self.read(t, int(rest[2]) % self.nvert)[rest[0], rest[1]]
+        return self.read(t)[rest]
+
+    def surface(self, t):
+        return self.read(t, 0)
+
+    def set_transform(self, transform):
+        self.transform = transform
+        self.cache = {}
+
+    def read(self, t, k=None):
+        """
+        (ny,nx,nvert) array at time index t, or (ny,nx) layer k
+        """
+        if (t, k) in self.cache:
+            return self.cache[(t, k)]
+        fname = 'Output/'+self.filestr + '%05d.bin' % (self.times[t])
+        qf = self.qf
+        # Skip the header
+        if self.is_3d == 0:
+            var = np.memmap(fname, dtype=np.float32, mode='r', offset=4,
+                            shape=(qf.indexing.num_cells,))
+            ijk = qf.indexing.ijk
+            if k is None:
+                temp = np.zeros((qf.ny, qf.nx, self.nvert), dtype=np.float32)
+                temp[ijk[:, 1], ijk[:, 0], ijk[:, 2]] = var
+            else:
+                cells = self.cells(k)
+                temp = np.zeros((qf.ny, qf.nx), dtype=np.float32)
+                temp[ijk[cells, 1], ijk[cells, 0]] = var[cells]
+        else:
+            var = np.memmap(fname, dtype=np.float32, mode='r', offset=4,
+                            shape=(self.nvert, qf.ny, qf.nx))
+            if k is None:
+                temp = np.ascontiguousarray(np.moveaxis(var, 0, -1))
+            else:
+                temp = np.array(var[k])
+        del var
+        if self.transform is not None:
+            temp = self.transform(temp)
+        temp.flags.writeable = False
+        self.cache[(t, k)] = temp
+        while len(self.cache) > self.cache_size:
+            del self.cache[next(iter(self.cache))]
+        return temp
+
+    def cells(self, k):
+        """
+        Positions of the compressed cells in layer k, grouped once per field
+        """
+        if self.layer_cells is None:
+            kk = self.qf.indexing.ijk[:, 2]
+            order = np.argsort(kk, kind='stable')
+            bounds = np.searchsorted(kk[order], np.arange(self.nvert + 1))
+            self.layer_cells = [np.sort(order[bounds[i]:bounds[i+1]]) for i in range(self.nvert)]
+        return self.layer_cells[k]
+
+
 def read_fireca_field(filestr, ntimes, times, qf, is_3d, *args, **kwargs):
-    outvar = []
+    """
+    Returns FirecaField, files are read when the field is sliced
+    """
     if (filestr == "mburnt_integ-" or filestr =="h"):
         nvert = 1
     else:
@@ -1279,33 +1372,29 @@ def read_fireca_field(filestr, ntimes, times, qf, is_3d, *args, **kwargs):
         else:
             nvert = layers
 
-    for i in range(0, ntimes):
-        fname = 'Output/'+filestr + '%05d.bin' % (times[i])
-        # Open file
-        fid = open_file(fname, 'rb')
-        temp = np.zeros((qf.ny, qf.nx, nvert))
-        # Read header
-        np.fromfile(fid, dtype=np.float32, count=1)
-        if is_3d == 0:
-            var = np.fromfile(fid, dtype=np.float32, count=qf.indexing.num_cells)
-            # http://scipy-cookbook.readthedocs.io/items/Indexing.html
-            index = [qf.indexing.ijk[::1, 1], qf.indexing.ijk[::1, 0], qf.indexing.ijk[::1, 2]]
-            temp[index] = var
-        else:
-            temp = np.zeros((qf.ny, qf.nx, nvert))
-            for k in range(0, nvert):
-                t = np.fromfile(fid, dtype=np.float32, count=qf.nx * qf.ny)
-                temp[::1, ::1, k] = np.reshape(t, (qf.ny, qf.nx))
-        
-        #ZCC remove canopy fuel to save memory
-        only_load_surface = kwargs.get('only_load_surface', False)
-        if only_load_surface:
-            temp = temp[:,:,0]
-        
-        outvar.append(temp)
-        fid.close()
+    #ZCC remove canopy fuel to save memory
+    only_load_surface = kwargs.get('only_load_surface', False)
+    return FirecaField(filestr, times[:ntimes], qf, is_3d, nvert, only_load_surface,
+                       kwargs.get('transform', None))
+
+
+def positive_log10(var):
+    # log10 of the positive values, everything else is unchanged
+    out = var.copy()
+    out[var > 0] = np.log10(var[var > 0])
+    return out
+
 
-    return outvar
+def log10_range(field):
+    # Range of log10 of the positive values of every time in field
+    minval = +1e8
+    maxval = -1.
+    for var in field:
+        pos = var[var > 0]
+        if len(pos):
+            minval = min(minval, float(np.log10(pos.min())))
+            maxval = max(maxval, float(np.log10(pos.max())))
+    return minval, maxval
 
 
 def open_file(filename, howto):
@@ -1905,7 +1994,7 @@ def ROS_BA(qf, fuelvar, save_dir, ig):
             down_wind_ignited = ig.y_min
         
     for i in range(1, len(fuelvar)):
-        burned_cell_indices = np.where((fuelvar[0][:,:,0]-fuelvar[i][:,:,0])>0)  
+        burned_cell_indices = np.where((fuelvar.surface(0)-fuelvar.surface(i))>0)  
         #Calculate burned area - initial ignition
         TOTAL_AREA.append(len(burned_cell_indices[0])*cell_area - ig.area)
         
@@ -20,7 +20,7 @@ setup(
                       'gdal',
                       'rasterio',
                       'fastfuels',
-                      'shapely'],
+                      'shapely>=2.0'],
     classifiers=[
         'Intended Audience :: Developers',
         'Topic :: Scientific/Engineering :: GIS',
@@ -5,7 +5,12 @@ Created on Thu Mar 17 11:37:57 2022
 @author: zcope
 """
 import os
+import json
+import time
+import shutil
+import hashlib
 import numpy as np
+import ttrs_quicfire.dat_file_functions as dat
 #import inspect
 
 
@@ -99,15 +104,16 @@ class AlbersEqualAreaConic: # Used exclusively to convert Albers  to Lat/Long (F
         Performs forward projection from geodetic coordinates to projected
         coordinates
         Args:
-            lat (float): latitude
-            lon (float): longitude
+            lat (float or array): latitude
+            lon (float or array): longitude
         Returns:
-            (x,y) coordinate projected in Albers Equal Area Conic
+            (x,y) coordinate projected in Albers Equal Area Conic, same shape
+            as lat and lon
         """
 
         # convert to radians for numpy trig functions
-        lat = np.radians(lat)
-        lon = np.radians(lon)
+        lat = np.radians(np.asarray(lat, dtype=float))
+        lon = np.radians(np.asarray(lon, dtype=float))
 
         # preliminaries
         q = self._q(lat)
@@ -120,17 +126,21 @@ class AlbersEqualAreaConic: # Used exclusively to convert Albers  to Lat/Long (F
 
         return x,y
 
-    def inverse(self, x, y):
+    def inverse(self, x, y, max_iter=100):
         """
         Performs inverse projection from Albers to geodetic coordinates
         Args:
-            x (float): x projected in Albers
-            y (float): y projected in Albers
+            x (float or array): x projected in Albers
+            y (float or array): y projected in Albers
+            max_iter (int): maximum number of latitude iterations
         Returns:
-            lat and lon in geodetic coordinates
+            lat and lon in geodetic coordinates, same shape as x and y
         """
 
         # preliminaries
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        shape = x.shape
+        x, y = x.ravel(), y.ravel()
         p = np.sqrt(x*x + (self.rho_0 - y)**2)
         theta = np.arctan2(x, self.rho_0 - y)
         q = (self.C - ((p*p)*(self.n**2))/(self.a**2))/self.n
@@ -138,14 +148,22 @@ class AlbersEqualAreaConic: # Used exclusively to convert Albers  to Lat/Long (F
         # convergence criteria
         epsilon = 1e-6
 
-        # iterate latitude calculation until convergence
+        # iterate latitude calculation until every point converges
         phi = np.sin(q/2)
         next_phi = self._inverse_iteration(phi, q)
-        while (np.abs(np.degrees(phi) - np.degrees(next_phi)) > epsilon):
-            phi = next_phi
-            next_phi = self._inverse_iteration(phi, q)
+        active = np.abs(np.degrees(phi) - np.degrees(next_phi)) > epsilon
+        for i in range(max_iter):
+            if not active.any():
+                break
+            phi[active] = next_phi[active]
+            next_phi[active] = self._inverse_iteration(phi[active], q[active])
+            active[active] = np.abs(np.degrees(phi[active]) - np.degrees(next_phi[active])) > epsilon
+        if active.any():
+            print('[Warning] {} points did not converge in AlbersEqualAreaConic.inverse()'.format(active.sum()))
 
-        return np.degrees(phi), np.degrees(self.lambda_0 + theta/self.n)
+        lat = np.degrees(phi).reshape(shape)
+        lon = np.degrees(self.lambda_0 + theta/self.n).reshape(shape)
+        return lat[()], lon[()]
 
     def _inverse_iteration(self, phi, q):
         """Private member
@@ -158,7 +176,168 @@ class AlbersEqualAreaConic: # Used exclusively to convert Albers  to Lat/Long (F
             (1/(2*self.e))*np.log((1 - self.e*np.sin(phi))/(1 +
             self.e*np.sin(phi))))))
 
-def fastfuels_access(x_center,y_center,x_ext,y_ext,out_dir): 
+class FastFuelsServer:
+    """
+    Fetches fuel ROIs from the FastFuels server. The index is only opened on
+    the first request and then reused.
+    """
+    def __init__(self, url='https://wifire-data.sdsc.edu:9000/fastfuels/index.fio',
+                 ftype='s3', cache_limit=1e16):
+        self.url = url
+        self.ftype = ftype
+        self.cache_limit = cache_limit
+        self.fio = None
+
+    def write(self, x_center, y_center, x_ext, y_ext, out_dir, res_xyz=[2,2,1]):
+        import fastfuels as ff
+        if self.fio is None:
+            self.fio = ff.open(self.url, ftype=self.ftype)
+            self.fio.cache_limit = self.cache_limit
+        albers = AlbersEqualAreaConic()
+        lat, long = albers.inverse(x_center,y_center)
+        roi = self.fio.query(long, lat,xlen=x_ext,ylen=y_ext)
+        roi.write(out_dir+'/',res_xyz=res_xyz)
+        del roi
+
+class LocalFuelServer:
+    """
+    Serves fuel ROIs from a local directory, no network needed.
+
+    tile_dir holds one folder per ROI (as written by fastfuels roi.write) and
+    an index.json describing them:
+        {folder: {"x_center": float, "y_center": float, "x_ext": float,
+                  "y_ext": float, "res_xyz": [dx, dy, dz], "nbytes": int}}
+    A request is served from any ROI at the same res_xyz that covers it. If
+    the ROI is larger the .dat files are cropped to the request. The folder
+    of a FuelTileCache can be used as a LocalFuelServer.
+    """
+    def __init__(self, tile_dir):
+        self.tile_dir = tile_dir
+        self.index_path = os.path.join(tile_dir, 'index.json')
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def save_index(self):
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def find(self, x_center, y_center, x_ext, y_ext, res_xyz=[2,2,1]):
+        """
+        Returns the smallest ROI folder that covers the request, else None
+        """
+        best, best_area = None, None
+        for folder, roi in self.index.items():
+            if list(roi['res_xyz']) != list(res_xyz):
+                continue
+            if roi_window(roi, x_center, y_center, x_ext, y_ext) is None:
+                continue
+            area = roi['x_ext'] * roi['y_ext']
+            if best is None or area < best_area:
+                best, best_area = folder, area
+        return best
+
+    def write(self, x_center, y_center, x_ext, y_ext, out_dir, res_xyz=[2,2,1]):
+        folder = self.find(x_center, y_center, x_ext, y_ext, res_xyz)
+        if folder is None:
+            raise FileNotFoundError('No fuel ROI in {} covers ({}, {}) {}x{}m'.format(
+                self.tile_dir, x_center, y_center, x_ext, y_ext))
+        self.extract(folder, x_center, y_center, x_ext, y_ext, out_dir)
+        return folder
+
+    def extract(self, folder, x_center, y_center, x_ext, y_ext, out_dir):
+        """
+        Copies the ROI in folder to out_dir, cropping the .dat files if the
+        ROI is larger than the request (other files are only copied when the
+        ROI matches exactly)
+        """
+        roi = self.index[folder]
+        src_dir = os.path.join(self.tile_dir, folder)
+        j0, j1, i0, i1 = roi_window(roi, x_center, y_center, x_ext, y_ext)
+        ny, nx = roi_shape(roi)
+        exact = (j0, j1, i0, i1) == (0, ny, 0, nx)
+        for file in os.listdir(src_dir):
+            src = os.path.join(src_dir, file)
+            dst = os.path.join(out_dir, file)
+            if not os.path.isfile(src):
+                continue
+            if exact:
+                shutil.copyfile(src, dst)
+            elif file.endswith('.dat'):
+                dat.fort_crop(src, dst, ny, nx, slice(j0, j1), slice(i0, i1))
+
+class FuelTileCache(LocalFuelServer):
+    """
+    Persistent disk cache of fuel ROIs in front of a server (FastFuelsServer
+    by default). ROIs are reused when an earlier request covers the new one
+    and the least recently used ROIs are deleted once the cache holds more
+    than max_bytes.
+    """
+    def __init__(self, cache_dir, max_bytes=50e9, server='default'):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        super().__init__(cache_dir)
+        self.max_bytes = max_bytes
+        if server == 'default':
+            server = FastFuelsServer()
+        self.server = server
+
+    def write(self, x_center, y_center, x_ext, y_ext, out_dir, res_xyz=[2,2,1]):
+        folder = self.find(x_center, y_center, x_ext, y_ext, res_xyz)
+        if folder is None:
+            folder = self.download(x_center, y_center, x_ext, y_ext, res_xyz)
+        self.index[folder]['last_used'] = time.time()
+        self.extract(folder, x_center, y_center, x_ext, y_ext, out_dir)
+        self.evict(keep=folder)
+        self.save_index()
+        return folder
+
+    def download(self, x_center, y_center, x_ext, y_ext, res_xyz=[2,2,1]):
+        roi = {'x_center': x_center, 'y_center': y_center, 'x_ext': x_ext,
+               'y_ext': y_ext, 'res_xyz': list(res_xyz)}
+        folder = 'roi_' + hashlib.sha1(json.dumps(roi, sort_keys=True).encode()).hexdigest()[:12]
+        roi_dir = os.path.join(self.tile_dir, folder)
+        if not os.path.exists(roi_dir):
+            os.makedirs(roi_dir)
+        self.server.write(x_center, y_center, x_ext, y_ext, roi_dir, res_xyz)
+        roi['nbytes'] = sum(os.path.getsize(os.path.join(roi_dir, f)) for f in os.listdir(roi_dir))
+        self.index[folder] = roi
+        return folder
+
+    def evict(self, keep=None):
+        total = sum(roi['nbytes'] for roi in self.index.values())
+        by_age = sorted(self.index, key=lambda folder: self.index[folder].get('last_used', 0))
+        for folder in by_age:
+            if total <= self.max_bytes:
+                break
+            if folder == keep:
+                continue
+            shutil.rmtree(os.path.join(self.tile_dir, folder), ignore_errors=True)
+            total -= self.index.pop(folder)['nbytes']
+
+def roi_shape(roi):
+    return int(roi['y_ext']/roi['res_xyz'][1]), int(roi['x_ext']/roi['res_xyz'][0])
+
+def roi_window(roi, x_center, y_center, x_ext, y_ext, tol=1e-3):
+    """
+    Returns (j0, j1, i0, i1) cell window of the request inside roi, or None
+    if roi doesn't cover the request on the same grid
+    """
+    dx, dy = roi['res_xyz'][0], roi['res_xyz'][1]
+    ny, nx = roi_shape(roi)
+    window = []
+    for c, ext, roi_c, roi_ext, d, n in [(y_center, y_ext, roi['y_center'], roi['y_ext'], dy, ny),
+                                         (x_center, x_ext, roi['x_center'], roi['x_ext'], dx, nx)]:
+        offset = ((c - ext/2) - (roi_c - roi_ext/2)) / d
+        start = int(round(offset))
+        if abs(offset - start) > tol or start < 0 or start + int(ext/d) > n:
+            return None
+        window += [start, start + int(ext/d)]
+    return tuple(window)
+
+def fastfuels_access(x_center,y_center,x_ext,y_ext,out_dir,ff_server='default',res_xyz=[2,2,1]): 
     """
     Parameters
     ----------
@@ -172,23 +351,22 @@ def fastfuels_access(x_center,y_center,x_ext,y_ext,out_dir):
         y length (m)
     out_dir : str
         
+    ff_server : FastFuelsServer, LocalFuelServer or FuelTileCache
+        where the fuel comes from, default is a new FastFuelsServer
+    res_xyz : list
+        fuel resolution [dx, dy, dz] (m)
 
     Returns
     -------
     Builds FF fuel arrays in out_dir
 
     """
-    import fastfuels as ff
-    albers = AlbersEqualAreaConic()
-    fio = ff.open('https://wifire-data.sdsc.edu:9000/fastfuels/index.fio', ftype='s3')
-    fio.cache_limit = 1e16
-    
-    lat, long = albers.inverse(x_center,y_center)
-    roi = fio.query(long, lat,xlen=x_ext,ylen=y_ext)
-    roi.write(out_dir+'/',res_xyz=[2,2,1])     
-    del roi
+    if ff_server == 'default':
+        ff_server = FastFuelsServer()
+    ff_server.write(x_center, y_center, x_ext, y_ext, out_dir, res_xyz)
     
-def build_ff_domain(dom, out_dir, FF_request, use_topo):
+def build_ff_domain(dom, out_dir, FF_request, use_topo, mmap=False, z_range=None, max_workers=1, cache=False,
+                    ff_server='default', compact=False, verbose=False):
     import ttrs_quicfire.quic_fire as qf
     x_center,y_center,x_ext,y_ext = [dom.x_center, dom.y_center, dom.X_length, dom.Y_length] 
     # if out_dir=='default':
@@ -199,9 +377,9 @@ def build_ff_domain(dom, out_dir, FF_request, use_topo):
         os.makedirs(out_dir)
     
     if FF_request:
-        fastfuels_access(x_center,y_center,x_ext,y_ext,out_dir)
+        fastfuels_access(x_center,y_center,x_ext,y_ext,out_dir,ff_server)
         
-    return qf.QF_Fuel_Arrays(dom, out_dir, use_topo)
+    return qf.QF_Fuel_Arrays(dom, out_dir, use_topo, mmap, z_range, max_workers, cache, compact, verbose)
 
 if __name__=="__main__":
     main()
@@ -5,13 +5,17 @@ Created on Wed Mar 23 22:52:28 2022
 @author: zcope
 """
 
-from distutils.log import debug
 import geopandas as gpd
 import pandas as pd
 import numpy as np
 import os
+from collections import OrderedDict
+import shapely
 from shapely.geometry import Polygon, Point, LineString, mapping
 
+SHAPEFILE_CACHE = OrderedDict() #Loaded shapefiles from load_shapefile
+SHAPEFILE_CACHE_BYTES = 1e9 #Evict least recently used past this size on disk
+
 class Domain_Params:
     """
     Class contains domain parameters
@@ -49,7 +53,7 @@ class Domain_Params:
         self.ToCopy = ToCopy_PATH
 
 def boundingbox(shape_paths, buffer, QF_PATH):
-    burn_plot = load_shapefile(shape_paths.burn_plot)
+    burn_plot = load_shapefile(shape_paths.burn_plot, copy=False)
     
     #Build bounding box for burn plot
     xmin,ymin,xmax,ymax = burn_plot.loc[[0],'geometry'].total_bounds 
@@ -73,23 +77,80 @@ def boundingbox(shape_paths, buffer, QF_PATH):
     return dom
 
 def clip_to_bbox(shp_to_clip, bbox):
+    """
+    Clips shp_to_clip to bbox. When shp_to_clip is a path, the STRtree
+    kept with it in SHAPEFILE_CACHE (see load_indexed) picks the features
+    that intersect bbox and only those are clipped, so the tree of a source
+    file is built once and queried per bbox. GeoDataFrames are clipped
+    as they are.
+    """
     #loads shapefile if given a path
-    if isinstance(shp_to_clip, str):
-        shp_to_clip = load_shapefile(shp_to_clip)
     if isinstance(bbox, str):
-        bbox = load_shapefile(bbox)
+        bbox = load_shapefile(bbox, copy=False)
+    if isinstance(shp_to_clip, str):
+        shp_to_clip, tree = load_indexed(shp_to_clip)
+        mask = shapely.union_all(bbox.geometry.values)
+        shp_to_clip = shp_to_clip.iloc[np.sort(tree.query(mask, predicate='intersects'))]
     clipped_shape = gpd.clip(shp_to_clip, bbox)
     return clipped_shape
 
 
-def load_shapefile(file_path):
+def load_shapefile(file_path, epsg=5070, copy=True):
+    """
+    Loads file_path reprojected to epsg. Loaded shapefiles are kept in
+    SHAPEFILE_CACHE keyed by (path, mtime, size, epsg) so each file is only
+    read and reprojected once while it is unchanged.
+
+    copy = False returns a shallow copy that shares the cached columns, so
+    adding or replacing columns is safe but editing values in place is not
+    """
+    return cache_entry(file_path, epsg)[0].copy(deep=copy)
+
+def load_indexed(file_path, epsg=5070):
+    """
+    Returns the cached GeoDataFrame of file_path (shared, read only) and a
+    shapely STRtree of its geometry. The tree is built the first time it is
+    asked for and kept in SHAPEFILE_CACHE with the frame.
+    """
+    entry = cache_entry(file_path, epsg)
+    if entry[2] is None:
+        entry[2] = shapely.STRtree(entry[0].geometry.values)
+    return entry[0], entry[2]
+
+def cache_entry(file_path, epsg):
+    """
+    [GeoDataFrame, size on disk, STRtree or None] of file_path in
+    SHAPEFILE_CACHE, read on a miss
+    """
     if file_path == None:
         raise FileNotFoundError
-    shapefile = gpd.read_file(file_path)
-    return shapefile.to_crs(epsg=5070)
+    stat = os.stat(file_path)
+    path = os.path.abspath(file_path)
+    key = (path, stat.st_mtime_ns, stat.st_size, epsg)
+    if key in SHAPEFILE_CACHE:
+        SHAPEFILE_CACHE.move_to_end(key)
+    else:
+        for old_key in [k for k in SHAPEFILE_CACHE if k[0] == path and k[3] == epsg]:
+            del SHAPEFILE_CACHE[old_key]
+        shapefile = gpd.read_file(file_path).to_crs(epsg=epsg)
+        SHAPEFILE_CACHE[key] = [shapefile, shapefile_bytes(file_path), None]
+        #Evict least recently used shapefiles, always keep the newest one
+        while (len(SHAPEFILE_CACHE) > 1 and
+               sum(entry[1] for entry in SHAPEFILE_CACHE.values()) > SHAPEFILE_CACHE_BYTES):
+            SHAPEFILE_CACHE.popitem(last=False)
+    return SHAPEFILE_CACHE[key]
+
+def shapefile_bytes(file_path):
+    """
+    Size on disk of a shapefile's geometry and attribute files
+    """
+    stem = os.path.splitext(file_path)[0]
+    paths = {file_path, stem + '.dbf'}
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
 
 def linestring_to_polygon(gdf):
     #https://stackoverflow.com/questions/2964751/how-to-convert-a-geos-multilinestring-to-polygon
+    gdf = gdf.copy()
     gdf['geometry'] = [Polygon(mapping(x)['coordinates']) for x in gdf.geometry]
     return gdf
 
@@ -101,12 +162,13 @@ def polygon_to_linestring(gdf):
     # lons = [x[0] for x in all_coords]
     # line_str = LineString(zip(lons, lats))
     # return gpd.GeoDataFrame(index=[0], crs=gdf.crs, geometry=[line_str])
+    gdf = gdf.copy()
     gdf['geometry'] = [LineString(x.exterior.coords) for x in gdf.geometry]
     return gdf
 
 def build_ig_lines(shape_paths, spacing, wind_dir):
-    bbox = load_shapefile(shape_paths.bbox)
-    burnplt = load_shapefile(shape_paths.burn_plot)
+    bbox = load_shapefile(shape_paths.bbox, copy=False)
+    burnplt = load_shapefile(shape_paths.burn_plot, copy=False)
     # Ensure burn plot is a polygon
     if isinstance(burnplt.iloc[0]['geometry'], LineString):
         burnplt = linestring_to_polygon(burnplt)
@@ -151,135 +213,53 @@ def build_ig_lines(shape_paths, spacing, wind_dir):
     nmesh = 128
     # Establish fine mesh on bbox, calibrated to diagonal length
     rmesh = np.sqrt((ymax - ymin) ** 2 + (xmax - xmin) ** 2) / nmesh
+    sin_t = np.sin(theta * np.pi / 180.0)
+    cos_t = np.cos(theta * np.pi / 180.0)
+
+    # Starting points of every line, all lines run at angle theta
+    x_starts = []
+    y_starts = []
+    # Horizontal (or nearly horizontal) lines do not start on the LOWER EDGE
+    if sin_t > 0.10452846326765346:
+        # Lines RIGHT from lower-left corner (xmin, ymin) along the LOWER EDGE
+        step = rho / sin_t
+        x_starts.append(xmin + step * np.arange(1, np.floor((xmax - xmin) / step) + 1))
+        y_starts.append(np.full(len(x_starts[-1]), ymin))
+    # Vertical lines do not start on the LEFT EDGE
+    if cos_t != 0.0:
+        # Lines UP from lower-left corner (xmin, ymin) along the LEFT EDGE
+        step = rho / cos_t
+        y_starts.append(ymin + step * np.arange(0, np.floor((ymax - ymin) / step) + 1))
+        x_starts.append(np.full(len(y_starts[-1]), xmin))
+    x_starts = np.concatenate(x_starts)
+    y_starts = np.concatenate(y_starts)
 
-    # Algorithm for generating lines on the fine mesh
-    # Store all ignition lines in long list
-    routes = {}  # Will be a list of GeoDataFrames
-    # Iterator through routes
-    ii = 0
-    # Horizontal (or nearly horizontal) lines do not need the first loop at all
-    if np.sin(theta * np.pi / 180.0) > 0.10452846326765346:
-        # First loop for drawing lines RIGHT from lower-left corner (xmin, ymin)
-        xstart = xmin + (rho / np.sin(theta * np.pi / 180.0))
-        # While the starting point lies along the LOWER EDGE of bbox
-        while xstart <= xmax:
-            # Build line ignition across bbox at angle theta
-            xx = xstart
-            # Always start these lines along LOWER EDGE of bbox
-            yy = ymin
-            xline = []  # Will be built up with x-coords
-            yline = []  # Will be built up with y-coords
-            geom = []  # Stores point geometries (xx, yy)
-            # Inner loop to set points along fine mesh
-            while (xx <= xmax) and (yy <= ymax):
-                # Add x-coords, y-coords, and point geometries to growing list
-                xline.append(xx)
-                yline.append(yy)
-                geom.append(Point(xx, yy))
-                # Iterate a distance rmesh across the fine mesh in direction theta
-                xx = xx + rmesh * np.cos(theta * np.pi / 180.0)
-                yy = yy + rmesh * np.sin(theta * np.pi / 180.0)
-            # Build a pandas dataframe with line coordinates
-            d = {'col1': np.ones_like(xline), 'col2': xline, 'col3': yline}
-            # Print to text file (for diagnostics)
-            with open("temp.txt", 'w') as f:
-                for key, value in d.items():
-                    f.write('%s:%s\n' % (key, value))
-            # As long as there is more than one point to work with
-            if len(geom) > 1:
-                # Draw a LineString
-                line = LineString(geom)
-                # Build and add this geometry to the routes list
-                d = {'geometry': [line]}
-                routes[ii] = gpd.GeoDataFrame(d, crs=5070)
-                print('...routes[{0}] written to memory'.format(ii))
-                # Iterate to next position on routes list
-                ii = ii + 1
-            # Next line to the RIGHT
-            xstart = xstart + (rho / np.sin(theta * np.pi / 180.0))
-        # De-iterate (to know where to store lines from the next loop)
-        ii = ii - 1
-    # Vertial lines do not need the second loop at all
-    if np.cos(theta * np.pi / 180.0) != 0.0:
-        # Second loop for drawing lines UP from lower-left corner (xmin, ymin)
-        ystart = ymin
-        # Iterator through routes
-        jj = 0
-        # While the starting point lies along the LEFT EDGE of bbox
-        while ystart <= ymax:
-            # Always start along LEFT EDGE of bbox
-            xx = xmin
-            # Build line ignition across bbox at angle theta
-            yy = ystart
-            xline = []  # Will be built up with x-coords
-            yline = []  # Will be built up with y-coords
-            geom = []  # Stores point geometries (xx, yy)
-            # Inner loop to set points along fine mesh
-            while (xx <= xmax) and (yy <= ymax):
-                # Add x-coords, y-coords, and point geometries to growing list
-                xline.append(xx)
-                yline.append(yy)
-                geom.append(Point(xx, yy))
-                # Iterate a distance rmesh across the fine mesh in direction theta
-                xx = xx + rmesh * np.cos(theta * np.pi / 180.0)
-                yy = yy + rmesh * np.sin(theta * np.pi / 180.0)
-            # Build a pandas dataframe with line coordinates
-            d = {'col1': np.ones_like(xline), 'col2': xline, 'col3': yline}
-            # Print to text file (for diagnostics)
-            with open("temp.txt", 'w') as f:
-                for key, value in d.items():
-                    f.write('%s:%s\n' % (key, value))
-            # As long as there is more than one point to work with
-            if len(geom) > 1:
-                # Draw a LineString
-                line = LineString(geom)
-                # Build and add this geometry to the routes list
-                d = {'geometry': [line]}
-                routes[ii + jj] = gpd.GeoDataFrame(d, crs=5070)
-                print('...routes[{0}] written to memory'.format(ii + jj))
-                # Iterate to next position on routes list
-                jj = jj + 1
-            # Next line UP
-            ystart = ystart + (rho / np.cos(theta * np.pi / 180.0))
-    # Report size of routes to the user (for diagnostics)
-    print('__sizeof__ routes is {0}'.format(routes.__sizeof__()))
+    # Lines end on the last fine mesh point (steps of rmesh) inside bbox
+    n_steps = np.full(len(x_starts), np.inf)
+    if cos_t > 0:
+        n_steps = np.minimum(n_steps, (xmax - x_starts) / (rmesh * cos_t))
+    if sin_t > 0:
+        n_steps = np.minimum(n_steps, (ymax - y_starts) / (rmesh * sin_t))
+    n_steps = np.floor(n_steps)
+    keep = n_steps >= 1
+    x_starts, y_starts, n_steps = x_starts[keep], y_starts[keep], n_steps[keep]
+    x_ends = x_starts + n_steps * rmesh * cos_t
+    y_ends = y_starts + n_steps * rmesh * sin_t
 
     # Apply the opposite rotation as was initially applied to the original bounding box
-    routes0 = {}
     if theta0 > 90.0 and theta0 <= 180.0:
-        # Loop through routes
-        for kk in range(len(routes)):
-            # Rotate the ignition lines back to the original frame
-            routes0[kk] = routes[kk].rotate(90.0, origin=(xmin0, ymin0))
+        back_rotation = 90.0
     elif theta0 > 180.0 and theta0 <= 270.0:
-        # Loop through routes
-        for kk in range(len(routes)):
-            # Rotate the ignition lines back to the original frame
-            routes0[kk] = routes[kk].rotate(180.0, origin=(xmin0, ymin0))
+        back_rotation = 180.0
     elif theta0 > 270.0 and theta0 <= 360.0:
-        # Loop through routes
-        for kk in range(len(routes)):
-            # Rotate the ignition lines back to the original frame
-            routes0[kk] = routes[kk].rotate(-90.0, origin=(xmin0, ymin0))
+        back_rotation = -90.0
     else:
-        # Loop through routes
-        for kk in range(len(routes)):
-            # No rotation necessary
-            routes0[kk] = routes[kk]
-
-    # Clip routes to the burn plot
-    routes0_clip = {}
-    for kk in range(len(routes0)):
-        routes0_clip[kk] = gpd.clip(routes0[kk], burnplt)
-
-    # Reorganize into a singleton dictionary
-    # This is the proper organization to write to shapefile
-    Lines = {'geometry': []}
-    for kk in range(len(routes0)):
-        Lines['geometry'].append(list(routes0[kk].geometry))
-    Lines['geometry'] = [val for sublist in Lines['geometry'] for val in sublist]
-    ignition = pd.DataFrame(Lines)
-    ignition = gpd.GeoDataFrame(ignition, geometry=ignition.geometry, crs=5070)
+        back_rotation = 0.0
+    x_starts, y_starts = rotate_points(x_starts, y_starts, back_rotation, (xmin0, ymin0))
+    x_ends, y_ends = rotate_points(x_ends, y_ends, back_rotation, (xmin0, ymin0))
+
+    lines = [LineString([(x0, y0), (x1, y1)]) for x0, y0, x1, y1 in zip(x_starts, y_starts, x_ends, y_ends)]
+    ignition = gpd.GeoDataFrame(geometry=gpd.GeoSeries(lines, crs=5070))
     
     #Number lines by distance to downwind corner of bbox
     if wind_dir >= 0.0 and wind_dir < 90:
@@ -292,7 +272,7 @@ def build_ig_lines(shape_paths, spacing, wind_dir):
         down_wind_corner = Point(xmax0,ymin0)
     
     #Use distance to down wind corner for sorting ignitions
-    ignition['Dist'] = ignition['geometry'].apply(lambda x: x.distance(down_wind_corner))
+    ignition['Dist'] = ignition.geometry.distance(down_wind_corner)
     #Clip ignition to burnplot
     ignition = gpd.clip(ignition, burnplt)
     #Remove ignitions within 6m of roads
@@ -306,30 +286,57 @@ def build_ig_lines(shape_paths, spacing, wind_dir):
     #ignition.to_file(os.path.join(shape_paths.SHAPE_PATH, 'ig_lines_after.shp'))
     return ignition
 
+def rotate_points(x, y, angle, origin):
+    """
+    Rotates coordinate arrays angle degrees ccw about origin, angle must be
+    a multiple of 90 so the rotation is exact
+    """
+    cos_a = np.round(np.cos(np.radians(angle)))
+    sin_a = np.round(np.sin(np.radians(angle)))
+    x0, y0 = origin
+    return (x0 + (x - x0) * cos_a - (y - y0) * sin_a,
+            y0 + (x - x0) * sin_a + (y - y0) * cos_a)
+
 def line_to_points_to_df(dom, ignition_lines, spacing=4):
+    """
+    Builds ignition points every spacing meters along each line, plus the
+    end of the line. All points are interpolated in one vectorized call.
+
+    Returns
+    -------
+    DataFrame with one row per point: geometry, the attributes of its line,
+    X, Y (m from domain origin), QF_X_index, QF_Y_index and IgTime
+    """
     if isinstance(ignition_lines, str):
-        ignition_lines = load_shapefile(ignition_lines)
+        ignition_lines = load_shapefile(ignition_lines, copy=False)
     
-    ig_points = gpd.GeoDataFrame()
-    for i in range(len(ignition_lines)):
-        line = ignition_lines.iloc[i]
-        line_geo = line['geometry']
-        distance_delta = spacing #Distance in meters
-        distances = np.arange(0, line_geo.length, distance_delta)
-        points = [line_geo.interpolate(distance) for distance in distances] + [line_geo.boundary.geoms[1]]
-        temp_dict = {'geometry':points}
-        for k in line.keys():
-            if k != 'geometry':
-                temp_dict[k] = [line[k],]*len(points)        
-        temp_points = gpd.GeoDataFrame(temp_dict, crs=5070)
-        ig_points = ig_points.append(temp_points)
+    geoms = np.asarray(ignition_lines.geometry.values, dtype=object)
+    lengths = shapely.length(geoms)
+    distance_delta = spacing #Distance in meters
+    n_interp = np.maximum(np.ceil(lengths / distance_delta), 0).astype(int)
+    n_points = n_interp + 1 #interpolated points + end of line
+    line_starts = np.cumsum(n_points) - n_points
+    line_idx = np.repeat(np.arange(len(geoms)), n_points)
+    point_num = np.arange(n_points.sum()) - np.repeat(line_starts, n_points)
+    is_end = point_num == np.repeat(n_interp, n_points)
+
+    points = np.empty(len(line_idx), dtype=object)
+    points[~is_end] = shapely.line_interpolate_point(geoms[line_idx[~is_end]],
+                                                     point_num[~is_end] * distance_delta)
+    points[is_end] = shapely.get_geometry(shapely.boundary(geoms), 1)
+
+    temp_dict = {'geometry': points}
+    for k in ignition_lines.columns:
+        if k != ignition_lines.geometry.name:
+            temp_dict[k] = ignition_lines[k].to_numpy()[line_idx]
+    ig_points = gpd.GeoDataFrame(temp_dict, index=point_num, crs=5070)
     #ig_points.to_file(os.path.join(dom.shape_paths.SHAPE_PATH, 'ig_points.shp'))
     
     df = pd.DataFrame(ig_points)
-    df['X'] = ig_points.apply(lambda x_dim: (x_dim.geometry.x - dom.xmin), axis=1).to_numpy()
-    df['Y'] = ig_points.apply(lambda y_dim: (y_dim.geometry.y - dom.ymin), axis=1).to_numpy()
-    df['QF_X_index'] = df['X'].apply(lambda x: int(x/dom.dx)).to_numpy()
-    df['QF_Y_index'] = df['Y'].apply(lambda y: int(y/dom.dy)).to_numpy()
+    df['X'] = shapely.get_x(points) - dom.xmin
+    df['Y'] = shapely.get_y(points) - dom.ymin
+    df['QF_X_index'] = (df['X'].to_numpy()/dom.dx).astype(int)
+    df['QF_Y_index'] = (df['Y'].to_numpy()/dom.dy).astype(int)
     df['IgTime'] = 0.0
     
     return df    
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Compact storage for (nz,ny,nx) fuel arrays that are mostly empty above the
+canopy. Only layers below the top of fuel in each column are stored.
+"""
+
+import numpy as np
+
+class ColumnFuelArray:
+    """
+    Fuel array stored column by column up to the top of fuel.
+
+    top[j,i] is the number of layers stored for column (j,i), at least 1 so
+    the surface layer is always dense. layers[z] holds the values of layer z
+    for every column with top > z, in row-major order. Everything above top
+    is zero.
+
+    Supports the indexing the QF_Fuel_Arrays edits use:
+        arr[0,:,:]          dense view of the surface layer (edits stick)
+        arr[z]              dense copy of layer z
+        arr[z0:z1, msk]     values of the columns in 2D bool msk
+        arr[z0:z1, msk] = v set v in those columns, values above top must
+                            stay 0
+    Slabs are expanded to dense one layer at a time, fort_export never
+    builds the full 3D array.
+    """
+    def __init__(self, top, layers, nz, dtype='float32'):
+        self.top = top
+        self.layers = layers
+        self.nz = nz
+        self.dtype = np.dtype(dtype)
+        self.shape = (nz,) + top.shape
+        self.size = int(np.prod(self.shape))
+        self.ndim = 3
+
+    @classmethod
+    def from_dense(cls, arr, top='default'):
+        """
+        Packs a dense (nz,ny,nx) array. top defaults to column_top(arr).
+        """
+        if isinstance(top, str) and top == 'default':
+            top = column_top([arr])
+        flat_top = top.ravel()
+        layers = []
+        for z in range(int(top.max())):
+            layers.append(np.ascontiguousarray(arr[z].ravel()[flat_top > z], dtype=arr.dtype))
+        return cls(top, layers, arr.shape[0], arr.dtype)
+
+    @property
+    def nbytes(self):
+        return self.top.nbytes + sum(layer.nbytes for layer in self.layers)
+
+    def __len__(self):
+        return self.nz
+
+    def cells(self, z):
+        """
+        Flat indices of the columns that store layer z
+        """
+        return np.flatnonzero(self.top.ravel() > z)
+
+    def layer(self, z):
+        """
+        Dense 2D layer z, a view for z = 0 and a copy otherwise
+        """
+        ny, nx = self.top.shape
+        if z == 0:
+            return self.layers[0].reshape(ny, nx)
+        dense = np.zeros(ny * nx, dtype=self.dtype)
+        if z < len(self.layers):
+            dense[self.cells(z)] = self.layers[z]
+        return dense.reshape(ny, nx)
+
+    def _split_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        z_key, rest = key[0], key[1:]
+        if isinstance(z_key, (int, np.integer)):
+            if z_key < 0:
+                z_key += self.nz
+            return [int(z_key)], True, rest
+        return list(range(self.nz)[z_key]), False, rest
+
+    def __getitem__(self, key):
+        zs, single, rest = self._split_key(key)
+        if single:
+            return self.layer(zs[0])[rest]
+        return np.stack([self.layer(z)[rest] for z in zs])
+
+    def __setitem__(self, key, value):
+        """
+        value must be a scalar or broadcast against a single layer. Only the
+        stored cells of each layer are written, layers at or above
+        len(layers) just check that value is 0 there.
+        """
+        zs, single, rest = self._split_key(key)
+        ny, nx = self.top.shape
+        hit = np.zeros((ny, nx), dtype=bool)
+        hit[rest] = True
+        hit = hit.ravel()
+        value = np.asarray(value, dtype=self.dtype)
+        full = None
+        if value.ndim:
+            full = np.zeros((ny, nx), dtype=self.dtype)
+            full[rest] = value
+            full = full.ravel()
+        high = [z for z in zs if z >= len(self.layers)]
+        if high and self._nonzero(value, full, hit):
+            raise self._above_top(high[0])
+        flat_top = self.top.ravel()
+        for z in [z for z in zs if z < len(self.layers)]:
+            if z == 0:
+                self.layer(0)[rest] = value
+                continue
+            stored = flat_top > z
+            if self._nonzero(value, full, hit & ~stored):
+                raise self._above_top(z)
+            self.layers[z][hit[stored]] = value if full is None else full[hit & stored]
+
+    @staticmethod
+    def _nonzero(value, full, cells):
+        if full is None:
+            return value != 0 and cells.any()
+        return np.any(full[cells] != 0)
+
+    @staticmethod
+    def _above_top(z):
+        return ValueError('Layer {} only stores columns below the top of fuel, '
+                          'use to_dense() to add fuel above it'.format(z))
+
+    def __iter__(self):
+        for z in range(self.nz):
+            yield self.layer(z)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def to_dense(self):
+        dense = np.zeros(self.shape, dtype=self.dtype)
+        for z in range(len(self.layers)):
+            dense[z] = self.layer(z)
+        return dense
+
+    def max(self):
+        return max([layer.max() for layer in self.layers] + [0])
+
+    def min(self):
+        low = min(layer.min() for layer in self.layers)
+        if len(self.layers) < self.nz or np.any(self.top.ravel() < len(self.layers)):
+            low = min(low, 0)
+        return low
+
+def column_top(arrs):
+    """
+    Number of layers up to the highest non-zero value of any array in arrs
+    for each (j,i) column, at least 1
+
+    Returns 2D int16 array (ny,nx)
+    """
+    top = np.ones(arrs[0].shape[1:], dtype=np.int16)
+    for arr in arrs:
+        for z in range(1, arr.shape[0]):
+            top[arr[z] != 0] = z + 1
+    return top
@@ -5,9 +5,18 @@ Created on Wed Mar 23 10:21:07 2022
 @author: zcope
 """
 
+import os
+import json
+import mmap
+import hashlib
+import numpy as np
 from scipy.io import FortranFile
+from ttrs_quicfire.exceptions import DataLengthMismatch
 
-def fort_import(domain,dat_str,three_axis=True):
+MARKER_DTYPE = np.dtype('uint32') #Fortran record length markers
+DATA_DTYPE = np.dtype('float32') #QF fuel values
+
+def fort_import(domain,dat_str,three_axis=True,mmap=False,copy_on_write=True,z_range=None):
     '''
     Importing GFortran Unformatted data into 
     # https://symbols.hotell.kau.se/2017/06/04/io-fortran-python/
@@ -15,17 +24,180 @@ def fort_import(domain,dat_str,three_axis=True):
     https://stackoverflow.com/questions/53639058/reading-fortran-binary-file-in-python
     
     This function reads a .dat file into an np.array
+
+    mmap = True returns an np.memmap view of the record instead of reading
+        it into memory. With copy_on_write = True edits stay in memory and
+        never touch dat_str; with copy_on_write = False edits are written
+        back to dat_str.
+    z_range = (z0, z1) only reads layers z0 <= z < z1, returned array has
+        shape (z1-z0,ny,nx). The rest of the record is never read.
     '''
     #print ('----- IMPORTING BULK DENSITY -----')
+    shape = domain_shape(domain, three_axis)
+
+    if mmap:
+        mode = 'c' if copy_on_write else 'r+'
+        return fort_memmap(dat_str, shape, mode, z_range)
+    if z_range is not None:
+        return fort_read_layers(dat_str, shape, z_range)
+
     data = FortranFile(dat_str,'r','uint32')
     data = data.read_ints('float32').T
-    if three_axis:
-        data = data.reshape(domain.nz,domain.ny,domain.nx)
-    else:
-        data = data.reshape(1, domain.ny, domain.nx)
-    
+    data = data.reshape(shape)
+
     return data
 
+def cached_import(domain, dat_str, three_axis=True, cache_dir='default'):
+    '''
+    fort_import through a .npy cache so unchanged .dat files are only parsed
+    once. The cache is keyed by the size, mtime and sha256 of dat_str:
+        -size and mtime match: the cache is used without reading dat_str
+        -only the mtime changed: dat_str is hashed, and only re-parsed if
+            the hash changed
+        -the size changed: dat_str is re-parsed without hashing, the hash
+            is taken the next time only its mtime changes
+    cache_dir defaults to a cache folder next to dat_str.
+
+    Returns np.memmap (copy-on-write) of the cached array
+    '''
+    if cache_dir == 'default':
+        cache_dir = os.path.join(os.path.dirname(dat_str), 'cache')
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    name = os.path.splitext(os.path.basename(dat_str))[0]
+    npy_str = os.path.join(cache_dir, name + '.npy')
+    key_str = os.path.join(cache_dir, name + '.json')
+
+    stat = os.stat(dat_str)
+    key = {'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+           'shape': list(domain_shape(domain, three_axis))}
+    old_key = {}
+    if os.path.exists(key_str) and os.path.exists(npy_str):
+        with open(key_str) as f:
+            old_key = json.load(f)
+
+    if all(old_key.get(k) == key[k] for k in ['size', 'mtime', 'shape']):
+        return np.load(npy_str, mmap_mode='c')
+    key['sha256'] = None
+    if old_key.get('size') == key['size'] and old_key.get('shape') == key['shape']:
+        key['sha256'] = file_hash(dat_str)
+    if key['sha256'] is None or old_key.get('sha256') != key['sha256']:
+        data = fort_import(domain, dat_str, three_axis)
+        with open(npy_str + '.tmp', 'wb') as f:
+            np.save(f, data)
+        os.replace(npy_str + '.tmp', npy_str)
+        del data
+    with open(key_str, 'w') as f:
+        json.dump(key, f)
+    return np.load(npy_str, mmap_mode='c')
+
+def file_hash(file_str, chunk_size=2**24):
+    '''
+    Returns sha256 hex digest of a file, read chunk_size bytes at a time
+    '''
+    sha = hashlib.sha256()
+    with open(file_str, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def array_hash(data):
+    '''
+    Returns sha256 hex digest of the record fort_export would write for data,
+    hashed one z-slab at a time
+    '''
+    sha = hashlib.sha256(str(tuple(data.shape)).encode())
+    for z in range(len(data)):
+        sha.update(np.ascontiguousarray(data[z], dtype=DATA_DTYPE).data)
+    return sha.hexdigest()
+
+def domain_shape(domain, three_axis=True):
+    if three_axis:
+        return (domain.nz, domain.ny, domain.nx)
+    return (1, domain.ny, domain.nx)
+
+def fort_memmap(dat_str, shape, mode='c', z_range=None):
+    '''
+    Maps the single float32 record of a .dat file without reading it.
+    Pages are only read from disk the first time they are accessed.
+
+    Returns np.memmap with shape (nz,ny,nx), or (z1-z0,ny,nx) for z_range
+    '''
+    check_record(dat_str, shape)
+    offset, shape = _layer_offset(shape, z_range)
+    return np.memmap(dat_str, dtype=DATA_DTYPE, mode=mode,
+                     offset=offset, shape=shape)
+
+def prefetch_layers(data, z_range):
+    '''
+    Asks the OS to read layers z0 <= z < z1 of a memmap from fort_memmap in
+    the background (madvise WILLNEED). Nothing is copied, the pages stay
+    shared with the file until they are edited. No-op where madvise is not
+    available.
+    '''
+    mm = getattr(data, '_mmap', None)
+    if mm is None or not hasattr(mmap, 'MADV_WILLNEED'):
+        return
+    z0, z1 = z_range
+    layer_bytes = data[0].nbytes
+    start = data.offset % mmap.ALLOCATIONGRANULARITY + z0 * layer_bytes
+    aligned = start - start % mmap.PAGESIZE
+    mm.madvise(mmap.MADV_WILLNEED, aligned, start - aligned + (z1 - z0) * layer_bytes)
+
+def fort_read_layers(dat_str, shape, z_range):
+    '''
+    Reads layers z0 <= z < z1 of a .dat file by seeking inside the record.
+
+    Returns np.array with shape (z1-z0,ny,nx)
+    '''
+    check_record(dat_str, shape)
+    offset, shape = _layer_offset(shape, z_range)
+    count = int(np.prod(shape))
+    data = np.fromfile(dat_str, dtype=DATA_DTYPE, count=count, offset=offset)
+    if len(data) != count:
+        raise DataLengthMismatch(dat_str, len(data), 'Requested Layers', count)
+    return data.reshape(shape)
+
+def fort_crop(src_str, dst_str, ny, nx, y_slice, x_slice):
+    '''
+    Saves [:, y_slice, x_slice] of the (nz,ny,nx) record in src_str to
+    dst_str. nz is taken from the record length so any layered .dat works.
+    '''
+    with open(src_str, 'rb') as f:
+        nbytes = int(np.fromfile(f, dtype=MARKER_DTYPE, count=1)[0])
+    nz = nbytes // (ny * nx * DATA_DTYPE.itemsize)
+    data = fort_memmap(src_str, (nz, ny, nx), 'r')
+    fort_export(data[:, y_slice, x_slice], dst_str)
+
+def check_record(dat_str, shape):
+    '''
+    Checks the uint32 markers on both sides of the record against shape so a
+    file from a different domain fails here instead of being silently misread.
+    '''
+    nbytes = int(np.prod(shape)) * DATA_DTYPE.itemsize
+    with open(dat_str, 'rb') as f:
+        head = np.fromfile(f, dtype=MARKER_DTYPE, count=1)
+        f.seek(MARKER_DTYPE.itemsize + nbytes)
+        tail = np.fromfile(f, dtype=MARKER_DTYPE, count=1)
+    if len(head) == 0 or head[0] != nbytes:
+        raise DataLengthMismatch(dat_str, int(head[0]) if len(head) else 0,
+                                 'Domain Record', nbytes)
+    if len(tail) == 0 or tail[0] != nbytes:
+        raise DataLengthMismatch(dat_str + ' (end marker)', int(tail[0]) if len(tail) else 0,
+                                 'Domain Record', nbytes)
+
+def _layer_offset(shape, z_range):
+    """
+    Byte offset and shape of layers z0 <= z < z1 inside a (nz,ny,nx) record
+    """
+    if z_range is None:
+        z_range = (0, shape[0])
+    z0, z1 = z_range
+    if z0 < 0 or z1 > shape[0] or z0 >= z1:
+        raise ValueError('z_range {} is outside of the {} layers in the domain'.format(z_range, shape[0]))
+    layer_bytes = shape[1] * shape[2] * DATA_DTYPE.itemsize
+    return MARKER_DTYPE.itemsize + z0 * layer_bytes, (z1 - z0, shape[1], shape[2])
+
 def fort_export(data, dat_str):
     '''
     Note that data in multidimensional arrays is written in row-major order — 
@@ -36,8 +208,20 @@ def fort_export(data, dat_str):
            but I haven't experimented to make sure that's true
     
     This function saves np.array to a .dat file
+
+    The record is streamed one z-slab at a time so only a single slab is
+    ever cast to float32. It is written to dat_str.tmp and moved over
+    dat_str at the end, which keeps arrays memory-mapped from dat_str valid.
     '''
     #print ('----- EXPORTING BULK DENSITY -----')
-    data = data.astype('float32')
-    datafile = FortranFile(dat_str,'w','uint32')
-    datafile.write_record(data)
\ No newline at end of file
+    nbytes = data.size * DATA_DTYPE.itemsize
+    if nbytes > np.iinfo(MARKER_DTYPE).max:
+        raise ValueError('Record of {} bytes is too large for a uint32 marker'.format(nbytes))
+    marker = np.array([nbytes], dtype=MARKER_DTYPE)
+    tmp_str = dat_str + '.tmp'
+    with open(tmp_str, 'wb') as datafile:
+        marker.tofile(datafile)
+        for z in range(len(data)):
+            np.ascontiguousarray(data[z], dtype=DATA_DTYPE).tofile(datafile)
+        marker.tofile(datafile)
+    os.replace(tmp_str, dat_str)
\ No newline at end of file
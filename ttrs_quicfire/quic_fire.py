@@ -6,22 +6,36 @@ Created on Wed Mar 23 10:10:35 2022
 """
 
 #TT Libraries
-from distutils.log import debug
 import ttrs_quicfire.build_FF_domain as FF
 import ttrs_quicfire.dat_file_functions as dat
 import ttrs_quicfire.print_inp_files
 import ttrs_quicfire.build_shapefiles as bs
+from ttrs_quicfire.column_fuel import ColumnFuelArray, column_top
 from ttrs_quicfire.exceptions import WindDirOutOfRange, WindSpeedOutOfRange, DataLengthMismatch
 
 #Standard Libraries
 #import geopandas as gpd
 import os
 import numpy as np
-import pandas as pd
 from rasterio.features import geometry_mask
+from rasterio.transform import Affine
 import sys
+import time
+import json
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import resource
+except ImportError: #Windows
+    resource = None
+from scipy.signal import lfilter
 from shapely.geometry import Polygon, LineString
 
+MASK_CACHE = OrderedDict() #Bit-packed masks from QF_Fuel_Arrays.cached_mask
+MASK_CACHE_BYTES = 256e6 #Evict least recently used past this size
+
 ###############################################################################   
 ###Classes
 class Shapefile_Paths:
@@ -57,28 +71,151 @@ class QF_Fuel_Arrays:
     """
     Class contains domain parameters
     """
-    def __init__(self, domain, FUEL_PATH, use_topo=True): 
+    def __init__(self, domain, FUEL_PATH, use_topo=True, mmap=False, z_range=None, max_workers=1,
+                 cache=False, compact=False, verbose=False): 
+        """
+        mmap = True maps the .dat files copy-on-write instead of reading
+            them, edits never touch the files in FUEL_PATH
+        z_range = (z0, z1) only reads layers z0 <= z < z1 up front, ex. (0, 1)
+            for surface-only edits. The .dat files are mapped copy-on-write,
+            the z_range pages are prefetched by the OS and the other layers
+            are read from disk on first access.
+        max_workers > 1 reads (and later exports) the four .dat files in a
+            thread pool. Per-file seconds are kept in load_times/export_times
+            and printed when max_workers > 1 or verbose = True.
+        cache = True reads the .dat files through a .npy cache in
+            FUEL_PATH/cache, see dat.cached_import. The cache is memory-mapped
+            so mmap and z_range are implied.
+        compact = True stores rhof, moist and depth as ColumnFuelArray, see
+            compact()
+        """
         self.dom = domain
-        self.rhof = dat.fort_import(domain, os.path.join(FUEL_PATH, 'bulk_density.dat'))
         self.rhof_name = 'bulk_density.dat'
-        self.moist = dat.fort_import(domain,  os.path.join(FUEL_PATH, 'moisture.dat'))
         self.moist_name = 'moisture.dat'
-        self.depth = dat.fort_import(domain,  os.path.join(FUEL_PATH, 'depth.dat'))
         self.depth_name = 'depth.dat'
-        self.topo = dat.fort_import(domain, os.path.join(FUEL_PATH, 'topo.dat'), False)
         self.topo_name = 'topo.dat'
+        self.max_workers = max_workers
+        self.cache = cache
+        self.verbose = verbose
+        jobs = {}
+        for name in [self.rhof_name, self.moist_name, self.depth_name]:
+            jobs[name] = (self.load_fuel, os.path.join(FUEL_PATH, name), True, mmap, z_range)
+        jobs[self.topo_name] = (self.load_fuel, os.path.join(FUEL_PATH, self.topo_name), False, mmap, None)
+        loaded, self.load_times = run_timed(jobs, max_workers)
+        if max_workers > 1 or verbose:
+            print_times('Loaded', self.load_times)
+        self.rhof = loaded[self.rhof_name]
+        self.moist = loaded[self.moist_name]
+        self.depth = loaded[self.depth_name]
+        self.topo = loaded[self.topo_name]
         self.use_topo = use_topo
         self.fuel_arrs = [self.rhof,self.moist,self.depth,self.topo]
         self.name_arrs = [self.rhof_name,self.moist_name,self.depth_name,self.topo_name]
+        self.stats = None #Cached by domain_stats
+        if compact:
+            self.compact()
     
-    def export_fuel(self, QF_PATH='default'):
+    def compact(self):
+        """
+        Repacks rhof, moist and depth so only the layers below the top of
+        fuel in each column are kept in memory. Edits work as before and
+        export_fuel expands one layer at a time.
+        """
+        top = column_top([self.rhof, self.moist, self.depth])
+        self.rhof = ColumnFuelArray.from_dense(self.rhof, top)
+        self.moist = ColumnFuelArray.from_dense(self.moist, top)
+        self.depth = ColumnFuelArray.from_dense(self.depth, top)
+        self.fuel_arrs = [self.rhof,self.moist,self.depth,self.topo]
+
+    def domain_stats(self):
+        """
+        Fuel and terrain statistics used by the QU grid and for QA, computed
+        in one pass over the z-layers of rhof (each layer is read once, so
+        memory-mapped arrays are only paged in once) and cached until
+        invalidate_stats() is called.
+        The edit methods (mod_wetlands, build_fuelbreak, apply_mask)
+        invalidate them, call invalidate_stats() after editing rhof or topo
+        directly.
+
+        Returns
+        -------
+        dict
+            column_top : (ny,nx) int16, layers up to the highest fuel in
+                each column, 0 without fuel
+            fuel_height : int, highest column_top
+            relief : topo max - min, 0 without use_topo
+            layer_mass : (nz,) float, kg of fuel in each layer
+            total_mass : float, kg of fuel in the domain
+        """
+        if self.stats is None:
+            cell_volume = self.dom.dx * self.dom.dy * self.dom.dz
+            rhof = self.rhof
+            nz = len(rhof)
+            if isinstance(rhof, ColumnFuelArray):
+                nz = len(rhof.layers) #Layers above are empty
+            top = np.zeros(rhof.shape[1:], dtype=np.int16)
+            layer_mass = np.zeros(len(rhof))
+            fuel_height = 0
+            for z in range(nz):
+                layer = rhof[z]
+                has_fuel = layer != 0
+                if has_fuel.any():
+                    top[has_fuel] = z + 1
+                    layer_mass[z] = layer.sum(dtype=np.float64) * cell_volume
+                    fuel_height = z + 1
+            relief = 0
+            if self.use_topo:
+                relief = self.topo.max() - self.topo.min()
+            self.stats = {'column_top': top,
+                          'fuel_height': fuel_height,
+                          'relief': relief,
+                          'layer_mass': layer_mass,
+                          'total_mass': layer_mass.sum()}
+        return self.stats
+
+    def invalidate_stats(self):
+        self.stats = None
+
+    def print_domain_stats(self):
+        stats = self.domain_stats()
+        print('Fuel height: {} layers, relief: {:.1f} m, fuel mass: {:.0f} kg'.format(
+            stats['fuel_height'], stats['relief'], stats['total_mass']))
+
+    def load_fuel(self, file_loc, three_axis, mmap, z_range):
+        if self.cache:
+            return dat.cached_import(self.dom, file_loc, three_axis)
+        if z_range is None:
+            return dat.fort_import(self.dom, file_loc, three_axis, mmap=mmap)
+        f_arr = dat.fort_import(self.dom, file_loc, three_axis, mmap=True)
+        dat.prefetch_layers(f_arr, z_range)
+        return f_arr
+
+    def export_fuel(self, QF_PATH='default', max_workers='default', names='all'):
+        '''
+        names = list of .dat file names to export, default every file in
+            export_arrays()
+        '''
         QF_PATH = self.dom.QF_PATH
-        for i,f_arr in enumerate(self.fuel_arrs[:-1]):
-            file_loc = os.path.join(QF_PATH, self.name_arrs[i])
-            dat.fort_export(f_arr, file_loc)
+        if max_workers == 'default':
+            max_workers = self.max_workers
+        jobs = {}
+        for name, f_arr in self.export_arrays().items():
+            if names == 'all' or name in names:
+                file_loc = os.path.join(QF_PATH, name)
+                jobs[name] = (dat.fort_export, f_arr, file_loc)
+        _, self.export_times = run_timed(jobs, max_workers)
+        if max_workers > 1 or self.verbose:
+            print_times('Exported', self.export_times)
+
+    def export_arrays(self):
+        '''
+        Returns dict {.dat file name: array} of the files a run needs,
+        topo.dat is only included with use_topo
+        '''
+        arrs = dict(zip(self.name_arrs[:-1], self.fuel_arrs[:-1]))
         if self.use_topo:
-            file_loc = os.path.join(QF_PATH, self.name_arrs[-1])
-            dat.fort_export(self.fuel_arrs[-1], file_loc)
+            arrs[self.name_arrs[-1]] = self.fuel_arrs[-1]
+        return arrs
 
     def update_surface_moisture(self, moist_in_plot=0.1, moist_out_plot='default'):
         '''
@@ -88,11 +225,13 @@ class QF_Fuel_Arrays:
         '''
         bbox_path = self.dom.shape_paths.bbox
         burn_plot_path = self.dom.shape_paths.burn_plot
-        burn_plot = bs.clip_to_bbox(burn_plot_path, bbox_path)
-        # Ensure burn plot is a ploygon
-        if isinstance(burn_plot.iloc[0]['geometry'], LineString):
-            burn_plot = bs.linestring_to_polygon(burn_plot)
-        msk = self.mask_from_shape(burn_plot)
+        def build_shape():
+            burn_plot = bs.clip_to_bbox(burn_plot_path, bbox_path)
+            # Ensure burn plot is a ploygon
+            if isinstance(burn_plot.iloc[0]['geometry'], LineString):
+                burn_plot = bs.linestring_to_polygon(burn_plot)
+            return burn_plot
+        msk = self.cached_mask(burn_plot_path, build_shape)
 
         z_layer = self.moist[0,:,:]
         z_layer[~msk] = moist_in_plot
@@ -106,8 +245,14 @@ class QF_Fuel_Arrays:
         '''
         bbox_path = self.dom.shape_paths.bbox
         wetlands_path = self.dom.shape_paths.wetlands
+        def build_shape():
+            wetlands = bs.clip_to_bbox(wetlands_path, bbox_path)
+            # Ensure burn plot is a ploygon
+            if isinstance(wetlands.iloc[0]['geometry'], LineString):
+                wetlands = bs.linestring_to_polygon(wetlands)
+            return wetlands
         try:
-            wetlands = bs.load_shapefile(wetlands_path)
+            msk = self.cached_mask(wetlands_path, build_shape)
         except FileNotFoundError as e:
             print('[Error] File wetlands.shp not found, cannot run mod_wetlands()')
             answer = input('Continue building? (y/n) ')
@@ -115,12 +260,6 @@ class QF_Fuel_Arrays:
                 return
             else:
                 sys.exit()
-        wetlands = bs.clip_to_bbox(wetlands, bbox_path)
-        
-        # Ensure burn plot is a ploygon
-        if isinstance(wetlands.iloc[0]['geometry'], LineString):
-            wetlands = bs.linestring_to_polygon(wetlands)
-        msk = self.mask_from_shape(wetlands)
         
         if fmc != 'default':
             z_layer = self.moist[0,:,:]
@@ -128,59 +267,109 @@ class QF_Fuel_Arrays:
         if bulk_density != 'default':
             z_layer = self.rhof[0,:,:]
             z_layer[~msk] = bulk_density
+            self.invalidate_stats()
            
+    def dom_transform(self):
+        """
+        Affine transform of the fuel grid, row 0 is the southern edge
+        """
+        dom = self.dom
+        return Affine(dom.dx, 0.0, dom.xmin, 0.0, dom.dy, dom.ymin)
+
     def mask_from_shape(self, shape):
+        """
+        Rasterizes shape straight onto the fuel grid.
+        Returns 2D bool array, False inside shape
+        """
         dom = self.dom
-        total_bounds = shape.total_bounds
-    
-        geoT = (dom.dx,0.0,total_bounds[0],
-               0.0,dom.dy,total_bounds[1])    
-        msk = geometry_mask(shape.geometry, np.shape(self.rhof[0,:,:]), geoT)
-        
-        #Orient location of mask
-        shape_extent = shape.bounds
-        msk = np.roll(msk, int(abs(dom.ymin-np.min(shape_extent['miny']))/dom.dy), axis=0)
-        msk = np.roll(msk, int(abs(dom.xmin-np.min(shape_extent['minx']))/dom.dx), axis=1)
-        return msk
+        return geometry_mask(shape.geometry, (dom.ny, dom.nx), self.dom_transform())
+
+    def cached_mask(self, shape_path, build_shape, buffer=None):
+        """
+        mask_from_shape(build_shape()) memoized in MASK_CACHE, keyed by
+        shape_path and its mtime, buffer and the fuel grid. build_shape is
+        only called (and the shapefile loaded) on a cache miss. Least
+        recently used masks are dropped past MASK_CACHE_BYTES.
+        """
+        if shape_path is None:
+            raise FileNotFoundError
+        dom = self.dom
+        key = (os.path.abspath(shape_path), os.path.getmtime(shape_path), buffer,
+               dom.dx, dom.dy, dom.xmin, dom.ymin, dom.ny, dom.nx)
+        if key in MASK_CACHE:
+            MASK_CACHE.move_to_end(key)
+        else:
+            MASK_CACHE[key] = np.packbits(self.mask_from_shape(build_shape()))
+            while (len(MASK_CACHE) > 1 and
+                   sum(packed.nbytes for packed in MASK_CACHE.values()) > MASK_CACHE_BYTES):
+                MASK_CACHE.popitem(last=False)
+        msk = np.unpackbits(MASK_CACHE[key], count=dom.ny*dom.nx)
+        return msk.reshape(dom.ny, dom.nx).astype(bool)
     
-    def build_fuelbreak(self, shape_path='default', buffer = 3):
+    def build_fuelbreak(self, shape_path='default', buffer = 3, z_top=None):
         '''
         Removes fuel in cells that overlaps road 
         Input:
             buffer = int or float to buffer fuelbreak shapefile
+            z_top = only clear layers below z_top, None clears every layer and
+                'auto' stops at the highest layer with fuel in the fuelbreak
         '''
         bbox_path = self.dom.shape_paths.bbox
         if shape_path == 'default':
             fb_path = self.dom.shape_paths.burn_plot
         else: fb_path = shape_path
         
+        def build_shape():
+            fuelbreak = bs.load_shapefile(fb_path, copy=False)
+            if isinstance(fuelbreak.iloc[0]['geometry'], Polygon):
+                fuelbreak = bs.polygon_to_linestring(fuelbreak)
+                #fuelbreak.to_file(os.path.join(self.dom.shape_paths.SHAPE_PATH, "TEST.shp"))
+                fuelbreak = bs.clip_to_bbox(fuelbreak, bbox_path)
+            else:
+                fuelbreak = bs.clip_to_bbox(fb_path, bbox_path)
+            fuelbreak = fuelbreak.buffer(buffer)
+            return bs.clip_to_bbox(fuelbreak, bbox_path)
         try:
-            fuelbreak = bs.load_shapefile(fb_path)
-        except:
+            msk = self.cached_mask(fb_path, build_shape, buffer)
+        except FileNotFoundError:
             print('[Error] File burn_plot.shp not found, cannot run build_fuelbreak().\n')
+            return
 
-        if isinstance(fuelbreak.iloc[0]['geometry'], Polygon):
-            fuelbreak = bs.polygon_to_linestring(fuelbreak)
-            #fuelbreak.to_file(os.path.join(self.dom.shape_paths.SHAPE_PATH, "TEST.shp"))
-        
-        fuelbreak = bs.clip_to_bbox(fuelbreak, bbox_path)
-        fuelbreak = fuelbreak.buffer(buffer)
-        fuelbreak = bs.clip_to_bbox(fuelbreak, bbox_path)
-        msk = self.mask_from_shape(fuelbreak)
-
-        for f_arr in self.fuel_arrs:
-            if f_arr is not self.topo:
-                for z in range(f_arr.shape[0]):
-                    z_layer = f_arr[z,:,:]
-                    z_layer[~msk] = 0
+        self.apply_mask(msk, 0, z_top=z_top)
+
+    def apply_mask(self, msk, value, f_arrs='default', z_top=None):
+        '''
+        Sets value in every cell inside msk (False) of the 3D fuel arrays
+        with one broadcast assignment per array
+        Input:
+            f_arrs = arrays to edit, default is rhof, moist and depth
+            z_top = int, 'auto' or None, see build_fuelbreak
+        '''
+        if f_arrs == 'default':
+            f_arrs = [self.rhof, self.moist, self.depth]
+        cols = ~msk
+        if z_top == 'auto':
+            filled = np.flatnonzero(self.rhof[:, cols].any(axis=1))
+            z_top = filled[-1] + 1 if len(filled) else 0
+        for f_arr in f_arrs:
+            f_arr[:z_top, cols] = value
+        self.invalidate_stats()
     
-    def calc_normal_windfield(self, start_speed, start_dir, start_time=0, shift_int=300, SENSOR_HEIGHT=6.1):
+    def calc_normal_windfield(self, start_speed, start_dir, start_time=0, shift_int=300, SENSOR_HEIGHT=6.1,
+                              seed=None, members=1):
+        '''
+        Builds a randomized wind field every shift_int seconds
+        Input:
+            seed = int or np.random.Generator, same seed gives the same wind
+            members = number of ensemble members, kept in self.wind.speed_members
+                and self.wind.dir_members. Member 0 is used for the run
+        '''
         times = list(range(start_time, start_time + self.dom.sim_time + 1, shift_int))
         if start_speed <= 0 or start_speed > 20:
             raise WindSpeedOutOfRange(start_speed)
         if start_dir < 0 or start_dir >= 360:
             raise WindDirOutOfRange(start_dir)
-        self.wind = WindShifts(times, start_speed, start_dir, SENSOR_HEIGHT)
+        self.wind = WindShifts(times, start_speed, start_dir, SENSOR_HEIGHT, seed=seed, members=members)
 
     def custom_windfield(self, speeds, dirs, times, SENSOR_HEIGHT=6.1):
         if len(speeds) != len(times):
@@ -195,34 +384,124 @@ class QF_Fuel_Arrays:
                 raise WindDirOutOfRange(dir)
         self.wind = WindShifts(times, speeds, dirs, SENSOR_HEIGHT, build=False)
 
+    def build_ensemble(self, winds='default', ignitions=None, ENS_PATH='default',
+                       link='hard', max_workers=4, ADD_TIME_AFTER_LAST_IG='default'):
+        '''
+        Builds one QF run per wind series from a single fuel export.
+        The base run is built in dom.QF_PATH, each run folder in ENS_PATH links
+        to its fuel .dat files and gets its own input files, ignite.dat and
+        FilesToCopy (staged like the base run, so only QU_landuse.inp and
+        the executable are linked). Editing one run never changes the others.
+        Input:
+            winds = list of WindShifts, 'default' uses every member of
+                self.wind (see calc_normal_windfield(members=N))
+            ignitions = None copies dom.QF_PATH/ignite.dat, or a list of
+                ignite.dat paths with one per wind. Each run's sim_time is
+                its last ignition + ADD_TIME_AFTER_LAST_IG
+            ENS_PATH = folder for the run folders, default dom.QF_PATH
+                + '_ensemble' next to the base run
+            link = 'hard' or 'sym' links for the fuel .dat files, they are
+                copied if linking fails
+            max_workers = threads rendering the per-run inputs
+            ADD_TIME_AFTER_LAST_IG = seconds simulated after the last
+                ignition of a run with its own ignitions, default keeps the
+                base run's (dom.sim_time - its last ignition)
+        Returns list of run folders
+        '''
+        pif = ttrs_quicfire.print_inp_files
+        if winds == 'default':
+            winds = [self.wind]
+            if hasattr(self.wind, 'speed_members'):
+                winds = [WindShifts(self.wind.times, speeds.tolist(), dirs.tolist(),
+                                    self.wind.SENSOR_HEIGHT, build=False)
+                         for speeds, dirs in zip(self.wind.speed_members, self.wind.dir_members)]
+        if ignitions is not None and len(ignitions) != len(winds):
+            raise DataLengthMismatch('Ignitions', len(ignitions), 'Winds', len(winds))
+        if ENS_PATH == 'default':
+            ENS_PATH = os.path.normpath(self.dom.QF_PATH) + '_ensemble'
+        if not os.path.exists(ENS_PATH):
+            os.makedirs(ENS_PATH)
+
+        strt_time = time.perf_counter()
+        build_qf_run(self)
+        shared = list(self.export_arrays())
+        dz_array = pif.qu_dz_array(self)
+        if ignitions is not None and ADD_TIME_AFTER_LAST_IG == 'default':
+            base_ig = read_ignite(os.path.join(self.dom.QF_PATH, 'ignite.dat'))
+            ADD_TIME_AFTER_LAST_IG = self.dom.sim_time - base_ig[:, 2].max()
+
+        def build_run(run_path, wind, ignite):
+            if not os.path.exists(run_path):
+                os.mkdir(run_path)
+            for f in shared:
+                pif.link_file(os.path.join(self.dom.QF_PATH, f), os.path.join(run_path, f), link)
+            sim_time = 'default'
+            if ignite is None:
+                ignite = os.path.join(self.dom.QF_PATH, 'ignite.dat')
+            else:
+                sim_time = int(read_ignite(ignite)[:, 2].max() + ADD_TIME_AFTER_LAST_IG)
+            pif.link_file(ignite, os.path.join(run_path, 'ignite.dat'), pif.COPY_METHODS)
+            pif.InputDeck(self, wind, dz_array, sim_time).write(run_path)
+            pif.stage_files(self.dom.ToCopy, run_path)
+
+        width = len(str(len(winds) - 1))
+        jobs = {}
+        for i, wind in enumerate(winds):
+            run_path = os.path.join(ENS_PATH, 'run_{}'.format(str(i).zfill(width)))
+            ignite = None if ignitions is None else ignitions[i]
+            jobs[run_path] = (build_run, run_path, wind, ignite)
+        _, self.ensemble_times = run_timed(jobs, max_workers)
+        print('Built {} runs in {:.3f} s'.format(len(jobs), time.perf_counter() - strt_time))
+        return list(jobs)
+
 #Currently only building normal wind field around
 class WindShifts:
     """
     Class creates randomized wind field
     """
-    def __init__(self, times, speed, dir, SENSOR_HEIGHT, build=True):
+    def __init__(self, times, speed, dir, SENSOR_HEIGHT, build=True, seed=None, members=1):
         self.times = times
         self.SENSOR_HEIGHT = SENSOR_HEIGHT
         if build:
-            self.dirs = [dir]
-            self.speeds = [speed]
-            self.build_wind_field(len(self.times), self.dirs, self.speeds)
+            self.build_wind_field(len(self.times), speed, dir, seed, members)
         else:
             self.dirs = dir
             self.speeds = speed
     
-    def build_wind_field(self, num_values, dirs, speeds):
-        for i in range(1,num_values):
-            dir1 = np.random.normal(dirs[0], 30, 1)[0] + 360 #gen normal num from starting dir
-            dir2 = np.random.normal(dirs[-1], 30, 1)[0] + 360 #gen normal num from prev dir
-            dirs.append(round(((dir1+dir2)/2)-360, 2))
-            
-            speed1 = np.random.normal(speeds[0], 1, 1)[0] #gen normal num from starting speed
-            speed2 = np.random.normal(speeds[-1], 1, 1)[0] #gen normal num from prev speed  
-            temp_speed = round((speed1+speed2)/2, 2)
-            if temp_speed <= 0:
-                temp_speed = round(np.random.uniform(low=0.01, high=0.1), 2)
-            speeds.append(temp_speed)
+    def build_wind_field(self, num_values, speed, dir, seed=None, members=1):
+        self.speed_members, self.dir_members = wind_ensemble(speed, dir, num_values, members, seed)
+        self.speeds = self.speed_members[0].tolist()
+        self.dirs = self.dir_members[0].tolist()
+
+def wind_ensemble(start_speed, start_dir, num_values, members=1, seed=None):
+    """
+    Randomized wind series for every ensemble member. Each step averages a
+    normal draw around the starting value and one around the previous value:
+        dir[i] = round((N(dir[0],30) + N(dir[i-1],30))/2, 2)
+        speed[i] = round((N(speed[0],1) + N(speed[i-1],1))/2, 2)
+    speeds <= 0 are replaced with uniform(0.01,0.1). The two draws are
+    taken as a single N((start+prev)/2, sd/sqrt(2)) draw, which has the same
+    distribution. The offset from the start is then a walk whose steps
+    decay by 1/2, offset[i] = sum(noise[k] / 2**(i-k)), computed for every
+    member and time at once as a cumulative filter along axis 1. Values are
+    rounded and calm speeds swapped in on the output, the walk itself is
+    not rounded.
+
+    seed : int, None or np.random.Generator
+
+    Returns speeds, dirs as (members,num_values) float arrays
+    """
+    rng = np.random.default_rng(seed)
+    dir_noise = rng.normal(0, 30 / np.sqrt(2), (members, num_values))
+    speed_noise = rng.normal(0, 1 / np.sqrt(2), (members, num_values))
+    calm = rng.uniform(0.01, 0.1, (members, num_values)).round(2)
+    dir_noise[:, 0] = 0 #Every member starts at start_dir and start_speed
+    speed_noise[:, 0] = 0
+
+    dirs = np.round(start_dir + lfilter([1], [1, -0.5], dir_noise, axis=1), 2)
+    speeds = np.round(start_speed + lfilter([1], [1, -0.5], speed_noise, axis=1), 2)
+    speeds = np.where(speeds <= 0, calm, speeds)
+    return speeds, dirs
 ############################################################################### 
 
 
@@ -231,9 +510,15 @@ class WindShifts:
 def atv_ignition(dom, wind_dir, num_ignitors = 3, line_space_chain = 1, 
                  ig_type='strip', dash_int_chain = 0.5, dot_int_chain = 0.25,
                  ignitors_wait_time = 20, ignition_num_wait_time = 0,
-                 ADD_TIME_AFTER_LAST_IG = 1800, SPEED_OF_IGNITION = 1):
+                 ADD_TIME_AFTER_LAST_IG = 1800, SPEED_OF_IGNITION = 1,
+                 crew_assignment='round_robin', binary=False):
     """
     Need to update: only builds lines currently
+
+    crew_assignment : name in CREW_ASSIGNMENTS or function(ignition_lines,
+        num_ignitors) returning (Ig_Num, ATV_Num) arrays for the lines
+        sorted by distance to the downwind corner
+    binary : also save the ignitions to ignite.npy, see print_ignite_dat
     """
     shape_paths = dom.shape_paths
     line_space_m = chain2meter(line_space_chain)
@@ -247,30 +532,18 @@ def atv_ignition(dom, wind_dir, num_ignitors = 3, line_space_chain = 1,
         ig_dirs = ('N-S','S-N')
     else: ig_dirs = ('E-W','W-E')
     
-    ignition_lines['Ig_Num'] = 0
-    ignition_lines['ATV_Num'] = 0
-    ignition_lines['Add_Time'] = 0
-    ignition_lines['Dir'] = ''
+    if isinstance(crew_assignment, str):
+        crew_assignment = CREW_ASSIGNMENTS[crew_assignment]
+    Ig_Num, ATV_Num = crew_assignment(ignition_lines, num_ignitors)
+    Ig_Num = np.asarray(Ig_Num, dtype=np.int64)
+    ATV_Num = np.asarray(ATV_Num, dtype=np.int64)
     
-    for i in range(len(ignition_lines)):
-        temp_Ig_Num = int((i/num_ignitors)+1)
-        ignition_lines.Ig_Num.iloc[i] = temp_Ig_Num
-        
-        temp_ATV_Num = int((i%num_ignitors)+1)
-        ignition_lines.ATV_Num.iloc[i] =temp_ATV_Num 
-        
-        if temp_Ig_Num==1 and temp_ATV_Num ==1:
-            temp_Add_Time = 0
-        elif temp_ATV_Num == 1:
-            temp_Add_Time = ignition_num_wait_time
-        else:
-            temp_Add_Time = ignitors_wait_time
-        ignition_lines.Add_Time.iloc[i] = temp_Add_Time
-        
-        if temp_Ig_Num%2 > 0.5:
-            temp_dir = ig_dirs[0]
-        else: temp_dir = ig_dirs[1]
-        ignition_lines.Dir.iloc[i] = temp_dir
+    Add_Time = np.where(ATV_Num == 1, ignition_num_wait_time, ignitors_wait_time)
+    Add_Time[(Ig_Num == 1) & (ATV_Num == 1)] = 0
+    ignition_lines['Ig_Num'] = Ig_Num
+    ignition_lines['ATV_Num'] = ATV_Num
+    ignition_lines['Add_Time'] = Add_Time
+    ignition_lines['Dir'] = np.where(Ig_Num % 2 == 1, ig_dirs[0], ig_dirs[1]).astype(object)
         
     #Save shapefile
     ignition_lines.to_file(os.path.join(shape_paths.SHAPE_PATH, 'ig_lines.shp'))
@@ -280,9 +553,44 @@ def atv_ignition(dom, wind_dir, num_ignitors = 3, line_space_chain = 1,
     elif ig_type == 'dot':
         df_ig_points = bs.line_to_points_to_df(dom, ignition_lines, spacing=dot_int_m)
         
-    gen_ig_times(dom, df_ig_points, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION)
+    gen_ig_times(dom, df_ig_points, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION, binary)
 
-def gen_ig_times(dom, df, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION):
+def round_robin_crews(ignition_lines, num_ignitors):
+    """
+    Each ignition (Ig_Num) sends every ATV down the next line in order
+    """
+    i = np.arange(len(ignition_lines))
+    return i // num_ignitors + 1, i % num_ignitors + 1
+
+def length_balanced_crews(ignition_lines, num_ignitors):
+    """
+    Ignitions cover the same lines as round_robin_crews, but within each
+    ignition the longest line goes to the ATV that has driven the least
+    """
+    lengths = ignition_lines['Length'].to_numpy()
+    Ig_Num, ATV_Num = round_robin_crews(ignition_lines, num_ignitors)
+    driven = np.zeros(num_ignitors)
+    for strt in range(0, len(lengths), num_ignitors):
+        ig_lines = np.arange(strt, min(strt + num_ignitors, len(lengths)))
+        longest_first = ig_lines[np.argsort(-lengths[ig_lines], kind='stable')]
+        least_driven = np.argsort(driven, kind='stable')[:len(ig_lines)]
+        ATV_Num[longest_first] = least_driven + 1
+        driven[least_driven] += lengths[longest_first]
+    return Ig_Num, ATV_Num
+
+def block_crews(ignition_lines, num_ignitors):
+    """
+    Each ATV keeps to its own block of neighbouring lines
+    """
+    i = np.arange(len(ignition_lines))
+    block_size = max(int(np.ceil(len(i) / num_ignitors)), 1)
+    return i % block_size + 1, i // block_size + 1
+
+CREW_ASSIGNMENTS = {'round_robin': round_robin_crews,
+                    'length_balanced': length_balanced_crews,
+                    'blocks': block_crews}
+
+def gen_ig_times(dom, df, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION, binary=False):
     """
     Reads in shaplefile of ig location to df and builds ignite.dat
     
@@ -292,6 +600,7 @@ def gen_ig_times(dom, df, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION):
     dom : domain params class   
     df : dataframe with ignition locations 
     SPEED_OF_IGNITION: (m/s)
+    binary : also save the ignitions to ignite.npy
 
     Modifies
     -------
@@ -299,62 +608,84 @@ def gen_ig_times(dom, df, ADD_TIME_AFTER_LAST_IG, SPEED_OF_IGNITION):
     
     Calls
     -------
-    print_ignite_dat(QF_PATH, df):
+    print_ignite_dat(QF_PATH, df, binary):
     """
     QF_PATH = dom.QF_PATH
-    strt_time = 1 #strt_time: Track start of atv igniter
-    atv_end_times = [] #track when all atvs finish ignitions
-    ig_num = np.sort(df.Ig_Num.unique())
-    frames=[] #Track new df slices with time column added
-    for ig in ig_num:
-        ig_df = df[df['Ig_Num']==ig]
-        ATV_num = np.sort(ig_df.ATV_Num.unique())
-        for atv in ATV_num:            
-            atv_df = ig_df[ig_df['ATV_Num']==atv]
-            ig_dir = atv_df['Dir'].unique()[0]
-            strt_time += atv_df['Add_Time'].unique()[0]
-            end_time = int(strt_time + atv_df['Length'].unique()[0]/SPEED_OF_IGNITION)
-            atv_end_times.append(end_time)
-            time_interval = (end_time-strt_time)/len(atv_df)
-            
-            #Sort based on ig_dir
-            if ig_dir == 'N-S':
-                atv_df = atv_df.sort_values('Y', ascending=False)
-            elif ig_dir == 'S-N':
-                atv_df = atv_df.sort_values('Y', ascending=True)
-            elif ig_dir == 'E-W':
-                atv_df = atv_df.sort_values('X', ascending=False)
-            elif ig_dir == 'W-E':
-                atv_df = atv_df.sort_values('X', ascending=True)
-            else: 
-                print("Don't recognize ignition direction: {}".format(ig_dir))
-                print("Check CSV")
-                sys.exit(0)
-            
-            #Loop through rows to specify ignition times
-            temp_IgTime = strt_time
-            for i, row in atv_df.iterrows():
-                atv_df.IgTime.loc[i] = temp_IgTime
-                temp_IgTime += time_interval
-            
-            frames.append(atv_df)
-            
-            #Update strt_time if starting new ignion
-            try:
-                if atv == np.max(ATV_num): #Check if at last atv in ignition
-                    strt_time = max(atv_end_times) #Mod current time if at the end of Ig_num
-                    atv_end_times = [] #Reset
-            except: pass #at end of iteration and don't need to calc current time any more
-    
-    df= pd.concat(frames)
+    df = schedule_ig_times(df, SPEED_OF_IGNITION)
     df.IgTime = df.IgTime.astype(int) #convert ignitions times to intervals
     dom.sim_time = df.IgTime.max() + ADD_TIME_AFTER_LAST_IG
     df = df.sort_values('IgTime', ascending=True) #sort by ignition time before printing
-    print_ignite_dat(QF_PATH, df)
+    print_ignite_dat(QF_PATH, df, binary)
     
     return
 
-def print_ignite_dat(QF_PATH, df):
+def schedule_ig_times(df, SPEED_OF_IGNITION):
+    """
+    Sets IgTime for every ignition point without looping over rows.
+
+    Each ATV run (Ig_Num, ATV_Num) starts Add_Time after the previous ATV of
+    the same ignition, the first ATV of an ignition starts when every ATV of
+    the last ignition has finished. Points are lit in the direction of Dir
+    at an even interval over Length/SPEED_OF_IGNITION seconds.
+
+    Returns
+    -------
+    df sorted by (Ig_Num, ATV_Num, direction of ignition) with IgTime set
+    """
+    dirs = df['Dir'].to_numpy()
+    for ig_dir in np.unique(dirs):
+        if ig_dir not in ('N-S', 'S-N', 'E-W', 'W-E'):
+            print("Don't recognize ignition direction: {}".format(ig_dir))
+            print("Check CSV")
+            sys.exit(0)
+    
+    #Sort once: by ignition, ATV then along the direction of ignition
+    key = np.where(np.isin(dirs, ['N-S', 'S-N']), df['Y'].to_numpy(), df['X'].to_numpy())
+    key = np.where(np.isin(dirs, ['N-S', 'E-W']), -key, key)
+    order = np.lexsort((key, df['ATV_Num'].to_numpy(), df['Ig_Num'].to_numpy()))
+    add_time = df['Add_Time'].to_numpy()
+    length = df['Length'].to_numpy()
+    df = df.iloc[order].copy()
+    
+    #One entry per ATV run
+    ig = df['Ig_Num'].to_numpy()
+    atv = df['ATV_Num'].to_numpy()
+    run_strts = np.flatnonzero(np.r_[True, (ig[1:] != ig[:-1]) | (atv[1:] != atv[:-1])])
+    run_sizes = np.diff(np.r_[run_strts, len(df)])
+    first_rows = np.minimum.reduceat(order, run_strts) #first row of each run in the input df
+    run_add_time = add_time[first_rows]
+    run_length = length[first_rows]
+    run_ig = ig[run_strts]
+    
+    #Start and end of each run, ignitions wait on the slowest ATV
+    run_strt_time = np.zeros(len(run_strts), dtype=np.result_type(run_add_time, np.int64))
+    run_end_time = np.zeros(len(run_strts), dtype=np.int64)
+    strt_time = 1 #strt_time: Track start of atv igniter
+    ig_strts = np.flatnonzero(np.r_[True, run_ig[1:] != run_ig[:-1]])
+    for a, b in zip(ig_strts, np.r_[ig_strts[1:], len(run_strts)]):
+        run_strt_time[a:b] = np.cumsum(np.r_[strt_time, run_add_time[a:b]])[1:]
+        run_end_time[a:b] = (run_strt_time[a:b] + run_length[a:b]/SPEED_OF_IGNITION).astype(np.int64)
+        strt_time = run_end_time[a:b].max()
+    time_interval = (run_end_time - run_strt_time)/run_sizes
+    
+    #Ramp from the start of each run, adding time_interval point by point.
+    #Runs are ordered longest first so the runs with a j-th point are a
+    #prefix, only O(number of runs) is kept besides IgTime
+    by_size = np.argsort(-run_sizes, kind='stable')
+    sizes = run_sizes[by_size]
+    firsts = run_strts[by_size]
+    steps = time_interval[by_size]
+    ramps = run_strt_time[by_size].astype(np.float64)
+    ig_times = np.empty(len(df))
+    for j in range(sizes[0]):
+        k = np.searchsorted(-sizes, -j, side='left') #runs with more than j points
+        ig_times[firsts[:k] + j] = ramps[:k]
+        ramps[:k] += steps[:k]
+    df['IgTime'] = ig_times
+    
+    return df
+
+def print_ignite_dat(QF_PATH, df, binary=False, chunk_size=100000):
     """
     Reads in shaplefile of ig location to df and builds ignite.dat
     
@@ -362,23 +693,49 @@ def print_ignite_dat(QF_PATH, df):
     ----------
     QF_PATH : path to QF_RUN
     df : dataframe with ignition locations     
+    binary : also save the ignitions to ignite.npy, see read_ignite
+    chunk_size : rows formatted per write
 
     Prints
     -------
     ignite.dat in QF directory
     """
-    with open(os.path.join(QF_PATH,'ignite.dat'), 'w') as input_file:
+    ignitions = np.column_stack([df['QF_X_index'].to_numpy(), df['QF_Y_index'].to_numpy(),
+                                 df['IgTime'].to_numpy()]).astype(np.int64)
+    ignite_path = os.path.join(QF_PATH, 'ignite.dat')
+    with open(ignite_path + '.tmp', 'w') as input_file:
         input_file.write("       igntype=    4\n")
         input_file.write("    &aeriallist\n")
         input_file.write("       naerial=  {}\n".format(len(df)))
         input_file.write("    targettemp= 1000.00\n")
         input_file.write("      ramprate=  172.00\n")
         input_file.write("/\n")
-        #for i, row in df.iterrows(): #Might be bad because it doesn't preserve dtype in the series
-        #    input_file.write("{}   {}   {}\n".format(row['QF_X_index'], row['QF_Y_index'], row['IgTime']))
-        for i in range(len(df)):    
-            input_file.write("{}   {}   {}\n".format(df.iloc[i]['QF_X_index'], df.iloc[i]['QF_Y_index'], df.iloc[i]['IgTime']))
+        for strt in range(0, len(ignitions), chunk_size):
+            chunk = ignitions[strt:strt + chunk_size]
+            input_file.write(("%d   %d   %d\n" * len(chunk)) % tuple(chunk.ravel().tolist()))
+    os.replace(ignite_path + '.tmp', ignite_path) #Never writes through a linked ignite.dat
+    if binary:
+        npy_path = os.path.join(QF_PATH, 'ignite.npy')
+        with open(npy_path + '.tmp', 'wb') as npy_file:
+            np.save(npy_file, ignitions.astype(np.int32))
+        os.replace(npy_path + '.tmp', npy_path)
     return        
+
+def read_ignite(file_path):
+    """
+    Reads ignitions from ignite.dat or ignite.npy
+
+    Returns
+    -------
+    (n,3) int array of QF_X_index, QF_Y_index, IgTime
+    """
+    if file_path.endswith('.npy'):
+        return np.load(file_path)
+    with open(file_path) as f:
+        for line in f:
+            if line.strip() == '/':
+                break
+        return np.loadtxt(f, dtype=np.int64, ndmin=2)
 ###############################################################################
 
 
@@ -396,18 +753,148 @@ def dom_from_burn_plot(shape_paths, buffer=30, QF_PATH='default'):
 
 ###############################################################################
 ###Functions for build qf_arrs (Fuel Domains)
-def build_ff_domain(dom, FUEL_PATH = 'default', FF_request=True, use_topo=True):
+def build_ff_domain(dom, FUEL_PATH = 'default', FF_request=True, use_topo=True, mmap=False, z_range=None, max_workers=1,
+                    cache=False, ff_server='default', compact=False, verbose=False):
+    """
+    ff_server : where FF_request gets fuel from. Default is the FastFuels
+        server, FF.FuelTileCache(cache_dir) keeps downloaded ROIs on disk and
+        FF.LocalFuelServer(tile_dir) works without a network
+    """
     if FUEL_PATH=='default':
         FUEL_PATH = bs.default_path('FF_Fuel')
-    qf_arrs = FF.build_ff_domain(dom, FUEL_PATH, FF_request, use_topo)
+    qf_arrs = FF.build_ff_domain(dom, FUEL_PATH, FF_request, use_topo, mmap, z_range, max_workers, cache, ff_server,
+                                 compact, verbose)
     return qf_arrs
 ###############################################################################
 
 
 ###############################################################################
 ###Functions for printing QF inputs
-def build_qf_run(qf_arrs):
-    ttrs_quicfire.print_inp_files.main(qf_arrs)
+def build_qf_run(qf_arrs, incremental=False):
+    """
+    incremental = True only rewrites the files of dom.QF_PATH whose inputs
+        changed since the last incremental build, see
+        print_inp_files.build_incremental
+    """
+    ttrs_quicfire.print_inp_files.main(qf_arrs, incremental)
+###############################################################################
+
+
+###############################################################################
+###Functions for building many burn plots
+def build_qf_batch(manifest, max_workers=None, memory_limit=None):
+    """
+    Builds a QF run for every plot in manifest, each plot in its own worker
+    process. Workers are replaced after every plot so memory is returned to
+    the system between plots.
+
+    Parameters
+    ----------
+    manifest : list of dicts or path to a .json file with that list, see
+        build_plot for the keys. Relative paths in a .json manifest are
+        relative to the manifest folder.
+    max_workers : number of worker processes, default os.cpu_count()
+    memory_limit : bytes of address space per worker (Unix only), a plot
+        that goes over fails with a MemoryError instead of swapping
+
+    Returns
+    -------
+    results : dict {name: {'status': 'ok' or 'failed', 'seconds', 'QF_PATH',
+        'error'}}
+    """
+    if isinstance(manifest, str):
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            manifest = json.load(f)
+        for plot in manifest:
+            for key in ['SHAPE_PATH', 'QF_PATH', 'FUEL_PATH', 'ToCopy_PATH']:
+                if key in plot:
+                    plot[key] = os.path.join(manifest_dir, plot[key])
+    plots = [dict(plot, name=plot.get('name', os.path.basename(os.path.dirname(os.path.abspath(plot['SHAPE_PATH'])))))
+             for plot in manifest]
+    names = [plot['name'] for plot in plots]
+    if len(set(names)) != len(names):
+        raise ValueError('Plot names in the manifest must be unique')
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    if memory_limit is not None and resource is None:
+        print('[Warning] memory_limit is only supported on Unix, workers will not be limited')
+
+    results = {}
+    if not plots:
+        print('Batch complete: 0 built, 0 failed')
+        return results
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(min(max_workers, len(plots)), initializer=_limit_memory, initargs=(memory_limit,),
+                  maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(build_plot, plots):
+            results[result['name']] = result
+            if result['status'] == 'ok':
+                print('[{}/{}] Built {} in {:.1f} s'.format(len(results), len(plots), result['name'],
+                                                            result['seconds']))
+            else:
+                print('[{}/{}] [Error] {} failed: {}'.format(len(results), len(plots), result['name'],
+                                                             result['error']))
+    failed = [name for name in names if results[name]['status'] != 'ok']
+    print('Batch complete: {} built, {} failed'.format(len(plots) - len(failed), len(failed)))
+    return {name: results[name] for name in names}
+
+def build_plot(plot):
+    """
+    Builds one plot of a build_qf_batch manifest. Never raises, failures
+    are returned with the traceback.
+
+    plot keys (only SHAPE_PATH is required):
+        name : defaults to the folder holding SHAPE_PATH
+        SHAPE_PATH : folder with burn_plot.shp and the other shapefiles
+        QF_PATH, FUEL_PATH : default to Run and FF_Fuel next to SHAPE_PATH
+        ToCopy_PATH : FilesToCopy folder, default cwd/FilesToCopy
+        buffer : dom_from_burn_plot buffer, default 30
+        ff_domain : dict of build_ff_domain keywords
+        fuelbreaks : list of dicts of build_fuelbreak keywords, default
+            [{}] (fuelbreak around the plot)
+        surface_moisture : dict of update_surface_moisture keywords
+        wetlands : dict of mod_wetlands keywords
+        ignition : dict of atv_ignition keywords, wind_dir is required
+        wind : dict of calc_normal_windfield keywords, or of
+            custom_windfield keywords if it has speeds
+    """
+    name = plot['name']
+    strt_time = time.perf_counter()
+    plot_dir = os.path.dirname(os.path.abspath(plot['SHAPE_PATH']))
+    QF_PATH = plot.get('QF_PATH', os.path.join(plot_dir, 'Run'))
+    try:
+        shape_paths = Shapefile_Paths(SHAPE_PATH=plot['SHAPE_PATH'])
+        if shape_paths.burn_plot is None:
+            raise FileNotFoundError(os.path.join(plot['SHAPE_PATH'], 'burn_plot.shp'))
+        dom = dom_from_burn_plot(shape_paths, buffer=plot.get('buffer', 30), QF_PATH=QF_PATH)
+        if 'ToCopy_PATH' in plot:
+            dom.ToCopy = plot['ToCopy_PATH']
+        qf_arrs = build_ff_domain(dom, FUEL_PATH=plot.get('FUEL_PATH', os.path.join(plot_dir, 'FF_Fuel')),
+                                  **plot.get('ff_domain', {}))
+        for fuelbreak in plot.get('fuelbreaks', [{}]):
+            qf_arrs.build_fuelbreak(**fuelbreak)
+        if 'surface_moisture' in plot:
+            qf_arrs.update_surface_moisture(**plot['surface_moisture'])
+        if 'wetlands' in plot:
+            qf_arrs.mod_wetlands(**plot['wetlands'])
+        atv_ignition(dom, **plot['ignition'])
+        if 'speeds' in plot['wind']:
+            qf_arrs.custom_windfield(**plot['wind'])
+        else:
+            qf_arrs.calc_normal_windfield(**plot['wind'])
+        build_qf_run(qf_arrs)
+    except (Exception, SystemExit) as e:
+        return {'name': name, 'status': 'failed', 'seconds': time.perf_counter() - strt_time,
+                'QF_PATH': QF_PATH, 'error': ': '.join(filter(None, [type(e).__name__, str(e)])),
+                'traceback': traceback.format_exc()}
+    return {'name': name, 'status': 'ok', 'seconds': time.perf_counter() - strt_time,
+            'QF_PATH': QF_PATH, 'error': None}
+
+def _limit_memory(memory_limit):
+    if memory_limit is not None and resource is not None:
+        memory_limit = int(memory_limit)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
 ###############################################################################
 
 
@@ -416,4 +903,38 @@ def build_qf_run(qf_arrs):
 
 def chain2meter(val):
     return val*20.1168
+
+def run_timed(jobs, max_workers=1):
+    """
+    Calls each job and times it
+
+    Parameters
+    ----------
+    jobs : dict {name: (function, *args)}
+    max_workers : int, > 1 runs the jobs in a thread pool (file reads and
+        writes release the GIL)
+
+    Returns
+    -------
+    results : dict {name: return value}
+    times : dict {name: seconds}
+    """
+    def timed(job):
+        strt_time = time.perf_counter()
+        result = job[0](*job[1:])
+        return result, time.perf_counter() - strt_time
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {name: pool.submit(timed, job) for name, job in jobs.items()}
+            timed_results = {name: future.result() for name, future in futures.items()}
+    else:
+        timed_results = {name: timed(job) for name, job in jobs.items()}
+    results = {name: r[0] for name, r in timed_results.items()}
+    times = {name: r[1] for name, r in timed_results.items()}
+    return results, times
+
+def print_times(action, times):
+    for name, seconds in times.items():
+        print('{} {} in {:.3f} s'.format(action, name, seconds))
 ###############################################################################
\ No newline at end of file